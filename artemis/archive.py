@@ -0,0 +1,198 @@
+"""
+Build tar archives on the fly
+
+The archives are generated chunk by chunk while they are sent (to the docker containers for example),
+so the data files are neither copied in temporary files nor entirely loaded in memory
+
+Each member has a digest of its content, to know if it has to be sent again
+"""
+import hashlib
+import io
+import os
+import tarfile
+import threading
+import zipfile
+
+import six
+
+_CHUNK_SIZE = 1024 * 1024
+
+_NUL = b'\0'
+
+
+def _read_chunks(path):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            yield chunk
+
+
+# the digests are kept for the session, several datasets can share the same file (the osm file for example)
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """
+    sha1 of the content of the file (computed only once for a given file)
+    """
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_size, stat.st_mtime)
+    with _file_digests_lock:
+        if key in _file_digests:
+            return _file_digests[key]
+
+    sha1 = hashlib.sha1()
+    for chunk in _read_chunks(path):
+        sha1.update(chunk)
+
+    with _file_digests_lock:
+        return _file_digests.setdefault(key, sha1.hexdigest())
+
+
+class BytesMember(object):
+    """
+    a small file of the archive, given by its content
+    """
+    def __init__(self, data, arcname):
+        self.data = data
+        self.arcname = arcname
+        self.size = len(data)
+        self.mtime = 0
+        self.digest = hashlib.sha1(data).hexdigest()
+
+    def chunks(self):
+        yield self.data
+
+
+class FileMember(object):
+    """
+    a file of the archive
+    """
+    def __init__(self, path, arcname):
+        self.path = path
+        self.arcname = arcname
+        self.size = os.path.getsize(path)
+        self.mtime = os.path.getmtime(path)
+
+    @property
+    def digest(self):
+        return file_digest(self.path)
+
+    def chunks(self):
+        return _read_chunks(self.path)
+
+
+class _Sink(object):
+    """
+    unseekable file-like object keeping what is written until it is drained
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipMember(object):
+    """
+    a zip (without compression) of several files, generated while the archive is sent
+
+    the zip is generated twice: a first time to know its size (needed in the tar header)
+    and a second time to be sent.
+    With python 2, zipfile can only write in a seekable file, so the zip is built in memory
+    """
+    def __init__(self, files, arcname):
+        """
+        :param files: list of (path, name in the zip)
+        """
+        self.files = files
+        self.arcname = arcname
+        self.mtime = max([os.path.getmtime(path) for path, _ in files] or [0])
+        self._size = None
+        self._buffer = None
+
+    @property
+    def digest(self):
+        """
+        the digest depends only on the names and the contents of the files, not on their dates
+        """
+        sha1 = hashlib.sha1()
+        for path, name in sorted(self.files, key=lambda f: f[1]):
+            sha1.update('{}:{}\n'.format(name, file_digest(path)).encode('utf-8'))
+        return sha1.hexdigest()
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = sum(len(chunk) for chunk in self.chunks())
+        return self._size
+
+    def chunks(self):
+        if six.PY2:
+            return self._buffered_chunks()
+        return self._streamed_chunks()
+
+    def _streamed_chunks(self):
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w') as zip_file:
+            for path, name in self.files:
+                info = zipfile.ZipInfo.from_file(path, name)
+                with zip_file.open(info, 'w') as dest:
+                    for chunk in _read_chunks(path):
+                        dest.write(chunk)
+                        yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+
+    def _buffered_chunks(self):
+        if self._buffer is None:
+            self._buffer = io.BytesIO()
+            with zipfile.ZipFile(self._buffer, 'w') as zip_file:
+                for path, name in self.files:
+                    zip_file.write(path, arcname=name)
+        yield self._buffer.getvalue()
+
+
+def tar_stream(members):
+    """
+    generate the chunks of a tar archive of the members
+
+    >>> import io, tarfile, tempfile
+    >>> with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as f:
+    ...     _ = f.write(b'stop_id,stop_name')
+    >>> data = b''.join(tar_stream([FileMember(f.name, 'stops.txt'), ZipMember([(f.name, 'stops.txt')], 'fusio.zip')]))
+    >>> tar = tarfile.open(fileobj=io.BytesIO(data))
+    >>> print(tar.extractfile('stops.txt').read().decode())
+    stop_id,stop_name
+    >>> print(zipfile.ZipFile(tar.extractfile('fusio.zip')).read('stops.txt').decode())
+    stop_id,stop_name
+    """
+    for member in members:
+        info = tarfile.TarInfo(member.arcname)
+        info.size = member.size
+        info.mtime = member.mtime
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.GNU_FORMAT)
+
+        written = 0
+        for chunk in member.chunks():
+            if chunk:
+                written += len(chunk)
+                yield chunk
+        assert written == member.size, "{} changed while being archived".format(member.arcname)
+
+        remainder = member.size % tarfile.BLOCKSIZE
+        if remainder:
+            yield _NUL * (tarfile.BLOCKSIZE - remainder)
+
+    # end of archive
+    yield _NUL * (2 * tarfile.BLOCKSIZE)
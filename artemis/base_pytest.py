@@ -1,5 +1,8 @@
 import os
+import re
 import json
+import threading
+import time
 import requests
 import difflib
 import sys
@@ -7,14 +10,18 @@ import six
 import pytest
 import logging
 from collections import Counter, OrderedDict
-import docker
-import tarfile
-import zipfile
-from retrying import retry
 
-from artemis import default_checker, utils
+from artemis import archive, default_checker, load_test, utils, waiting
 from artemis.configuration_manager import config
 from artemis.common_fixture import CommonTestFixture
+from artemis.containers import containers, exec_commands
+from artemis.data_store import ContainerDataStore
+from artemis.latency_baseline import latency_checker
+from artemis.query_stats import QueryRecord
+from artemis.reload_benchmark import directory_size, reload_benchmark
+from artemis.service_manager import services
+from artemis.timing import timings
+from artemis.tracing import tracer
 
 if six.PY3: # case using python 3
     from enum import Enum
@@ -32,6 +39,112 @@ class Colors(Enum):
 
 logger = logging.getLogger(__name__)
 
+# (data type, suffix of the files, are the files sent in a zip)
+_DATA_TYPES = [
+    # the fusio data
+    ('fusio', '.txt', True),
+    # the osm data
+    ('osm', '.pbf', False),
+    # the poi data
+    ('poi', '.txt', True),
+    ('fusio-poi', '.txt', True),
+    # the geopal data
+    ('geopal', '.txt', True),
+    ('fusio-geopal', '.txt', True),
+    ('fusio-address', '.txt', True),
+]
+
+
+def get_last_coverage_loaded_time(cov):
+    _response, _, _ = utils.request("coverage/{cov}/status".format(cov=cov))
+    return _response.get('status', {}).get('last_load_at', "")
+
+
+_unmatched_logs_warned = set()
+
+
+def _warn_unmatched_log(setting, consequence):
+    """
+    warn (once for the session) that a pattern of the kraken logs did not match any line of a reload
+    """
+    if setting in _unmatched_logs_warned:
+        return
+    _unmatched_logs_warned.add(setting)
+    logger.warning("no line of the kraken logs matched {} ({!r}) during a data reload, {}".format(
+        setting, config[setting], consequence))
+
+
+class KrakenReloadWatch(object):
+    """
+    follow the reload of a kraken after its data were sent
+
+    the status of the coverage is polled, and probed right away when its kraken container
+    logs the beginning or the end of a data load, or is restarted.
+    The time between the upload and the reload ('binarization and kraken load') is always recorded.
+    When the kraken logs the beginning of its load (KRAKEN_LOAD_START_LOG), the time between the upload
+    and the beginning of the load (the binarization) and the time of the load by kraken are also recorded
+    """
+    def __init__(self, data_set):
+        self.data_set = data_set
+        self.wake = threading.Event()
+        self._load_start, self._load_end = None, None
+        self._events = []
+        try:
+            logs = containers.logs(data_set.name)
+            self._load_start = logs.listen(config['KRAKEN_LOAD_START_LOG'], self.wake)
+            self._load_end = logs.listen(config['KRAKEN_LOAD_END_LOG'], self.wake)
+            container_name = containers.kraken(data_set.name).name
+            self._events.append(containers.events().listen(r'^(start|die) {}$'.format(re.escape(container_name)),
+                                                           self.wake))
+        except Exception as e:
+            # the status is only polled
+            logger.warning("impossible to follow the kraken container of {}: {}".format(data_set.name, e))
+        self.last_reload_time = get_last_coverage_loaded_time(data_set.name)
+        self.upload_begin = None
+        self.uploaded_at = None
+        # durations of the phases of the reload, and of the whole reload (from the beginning of the upload)
+        self.durations = OrderedDict()
+        self.total = None
+
+    def uploaded(self, upload_begin):
+        self.upload_begin = upload_begin
+        self.uploaded_at = time.time()
+        self.durations['data upload'] = self.uploaded_at - upload_begin
+
+    def _stop(self):
+        if self._load_start:
+            containers.logs(self.data_set.name).unlisten(self._load_start)
+            containers.logs(self.data_set.name).unlisten(self._load_end)
+        for listener in self._events:
+            containers.events().unlisten(listener)
+
+    def wait(self, timeout):
+        cov = self.data_set.name
+        try:
+            waiting.wait_for(lambda: get_last_coverage_loaded_time(cov),
+                             until=lambda data_loaded: data_loaded != self.last_reload_time,
+                             name='kraken reload', label=cov, timeout=timeout, wake=self.wake)
+        finally:
+            self._stop()
+        loaded_at = time.time()
+
+        self.total = loaded_at - self.upload_begin
+        self.durations['binarization and kraken load'] = loaded_at - self.uploaded_at
+        load_starts = [t for t in (self._load_start.matched_at if self._load_start else [])
+                       if t >= self.uploaded_at]
+        if load_starts:
+            self.durations['binarization'] = load_starts[0] - self.uploaded_at
+            self.durations['kraken load'] = loaded_at - load_starts[0]
+        elif self._load_start:
+            _warn_unmatched_log('KRAKEN_LOAD_START_LOG', "the binarization and the kraken load are not split")
+        if self._load_end and not self._load_end.matched_at:
+            _warn_unmatched_log('KRAKEN_LOAD_END_LOG', "the reload waits are only ended by the polling")
+        for phase, duration in self.durations.items():
+            if phase != 'data upload':
+                timings.add(phase, duration, label=cov)
+        logger.info('Kraken {} reloaded: {}'.format(
+            cov, ', '.join('{} {:.3f}s'.format(phase, d) for phase, d in self.durations.items())))
+
 
 def print_color(line, color=Colors.DEFAULT):
     """console print, with color"""
@@ -42,6 +155,9 @@ class ArtemisTestFixture(CommonTestFixture):
 
     dataset_binarized = []
 
+    # store of the data sent to the tyr_worker container, shared by all the fixtures
+    _data_store = None
+
     @pytest.fixture(scope='function', autouse=True)
     def before_each_test(self, request):
         """
@@ -53,122 +169,202 @@ class ArtemisTestFixture(CommonTestFixture):
         self.test_counter = Counter()
         self.check_ref = request.config.getvalue("check_ref")
         self.create_ref = request.config.getvalue("create_ref")
+        self.init_latency_budget(request)
+        if reload_benchmark.active:
+            pytest.skip("only the data reloads are benchmarked")
 
     @classmethod
     @pytest.yield_fixture(scope='class', autouse=True)
     def manage_data(cls, request):
-        skip_bina = request.config.getvalue("skip_bina")
-        if skip_bina:
-            logger.info("Skipping binarisation...")
-            return
+        with tracer.span('manage_data', fixture=cls.__name__):
+            if request.config.getvalue("check_ref"):
+                # no service is needed
+                return
+
+            # resolve all the containers needed by the fixture, to fail as soon as possible if one is missing
+            containers.tyr_worker()
+            for data_set in cls.data_sets:
+                containers.kraken(data_set.name)
+
+            if reload_benchmark.active:
+                cls.benchmark_data_reload()
+                return
+
+            skip_bina = request.config.getvalue("skip_bina")
+            if skip_bina:
+                logger.info("Skipping binarisation...")
+            else:
+                cls.update_data(cls.data_sets)
 
-        for data_set in cls.data_sets:
+            # the krakens modified by the previous fixtures are restarted
+            cls.restart_dirty_krakens()
+            cls.wait_for_krakens()
+
+    @classmethod
+    @tracer.traced()
+    def update_data(cls, data_sets):
+        to_update = []
+        for data_set in data_sets:
             if data_set.name in cls.dataset_binarized:
                 logger.info("binarization dataset {} has been done, skipping....".format(data_set))
                 continue
-            cls.remove_data_by_dataset(data_set)
-            cls.update_data_by_dataset(data_set)
-            cls.dataset_binarized.append(data_set.name)
+            to_update.append(data_set)
+
+        # the data sets are sent concurrently, then all the krakens reloads are waited for concurrently
+        workers = config['DATA_PUSH_WORKERS']
+        watches = utils.run_concurrently(cls.push_data_by_dataset, to_update, max_workers=workers)
+        utils.run_concurrently(cls.wait_for_data_reload, [w for w in watches if w is not None])
+
+        cls.dataset_binarized.extend(data_set.name for data_set in to_update)
+
+    @classmethod
+    @tracer.traced()
+    def benchmark_data_reload(cls):
+        """
+        send the whole data of each data set (not benchmarked yet) and wait for its reload, several times
+        """
+        for data_set in cls.data_sets:
+            if reload_benchmark.done(data_set.name):
+                continue
+            data_size = directory_size('{}/{}'.format(config['DATA_DIR'], data_set.name))
+            for _ in range(reload_benchmark.repeat):
+                watch = cls.push_data_by_dataset(data_set, force=True)
+                cls.wait_for_data_reload(watch)
+                reload_benchmark.add(data_set.name, watch.durations, total=watch.total, data_size=data_size)
+            if data_set.name not in cls.dataset_binarized:
+                cls.dataset_binarized.append(data_set.name)
 
     @classmethod
+    @tracer.traced()
     def remove_data_by_dataset(cls, data_set):
-        file_path = '/srv/ed/output/{}.nav.lz4'.format(data_set.name)
+        exec_commands(containers.tyr_worker(), [cls.remove_data_command(data_set)])
+
+    @classmethod
+    def remove_data_command(cls, data_set):
+        file_path = '{}/{}.nav.lz4'.format(config['CONTAINER_DATA_OUTPUT_PATH'], data_set.name)
         logger.info('path to volume from container: ' + file_path)
-        containers = [x for x in docker.DockerClient(version='auto').containers.list() if 'tyr_worker' in x.name]
-        if not containers:
-            logger.error("No Docker Container found for tyr_worker")
-        else:
-            containers[0].exec_run('rm ' + file_path)
+        return 'rm -f ' + file_path
 
     @classmethod
-    def update_data_by_dataset(cls, data_set):
-        def get_last_coverage_loaded_time(cov):
+    def get_data_store(cls):
+        if ArtemisTestFixture._data_store is None:
+            ArtemisTestFixture._data_store = ContainerDataStore(containers.tyr_worker(),
+                                                                cache_path=config['CONTAINER_DATA_CACHE_PATH'],
+                                                                output_path=config['CONTAINER_DATA_OUTPUT_PATH'],
+                                                                max_workers=config['DATA_PUSH_WORKERS'])
+        return ArtemisTestFixture._data_store
 
-            _response, _, _ = utils.request("coverage/{cov}/status".format(cov=cov))
-            return _response.get('status', {}).get('last_load_at', "")
+    @classmethod
+    def data_members(cls, data_set):
+        """
+        return the files to send to the container for the data set
+        """
+        members = []
+        for data_type, file_suffix, zipped in _DATA_TYPES:
+            path = '{}/{}/{}'.format(config['DATA_DIR'], data_set.name, data_type)
 
-        # wait 5 min at most
-        @retry(stop_max_delay=300000, wait_fixed=500)
-        def wait_for_kraken_reload(last_data_loaded, cov):
-            new_data_loaded = get_last_coverage_loaded_time(cov)
+            if not os.path.exists(path):
+                logger.warning('{} path does not exist : {}'.format(data_type, path))
+                continue
+
+            # get all the files names
+            files = [f for f in os.listdir(path)
+                     if f.endswith(file_suffix)]
 
-            if last_data_loaded == new_data_loaded:
-                raise Exception("kraken data is not loaded")
+            if zipped:
+                # put them into a zip
+                members.append(archive.ZipMember([('{}/{}'.format(path, f), f) for f in files],
+                                                 arcname='{}.zip'.format(data_type)))
+            else:
+                members.extend(archive.FileMember('{}/{}'.format(path, f), arcname=f) for f in files)
+        return members
+
+    @classmethod
+    def update_data_by_dataset(cls, data_set):
+        watch = cls.push_data_by_dataset(data_set)
+        if watch is not None:
+            cls.wait_for_data_reload(watch)
 
-            logger.info('Kraken reloaded')
+    @classmethod
+    @tracer.traced()
+    def push_data_by_dataset(cls, data_set, force=False):
+        """
+        send the data of the data set to the tyr_worker container
 
-        data_path = config['DATA_DIR']
+        with force, all the data are sent even if they did not change since the last binarization,
+        or if they are already in the cache of the container
+        return the KrakenReloadWatch of the reload of the kraken (None if there was nothing to send)
+        """
         input_path = '{}/{}'.format(config['CONTAINER_DATA_INPUT_PATH'], data_set.name)
 
         logger.info("updating data for {}".format(data_set.name))
 
-        # opening the container as client
-        containers = [x for x in docker.DockerClient(version='auto').containers.list() if 'tyr_worker' in x.name]
-        if not containers:
-            logger.error("No Docker Container found for tyr_worker")
+        store = cls.get_data_store()
+        members = cls.data_members(data_set)
+        # the digests of the files of the different data types are computed concurrently
+        utils.run_concurrently(lambda m: m.digest, members, max_workers=config['DATA_PUSH_WORKERS'])
+
+        if not force and store.nav_exists(data_set.name):
+            # only the data that changed since the last binarization are sent
+            manifest = store.read_manifest(data_set.name)
+            members_to_send = [m for m in members if manifest.get(m.arcname) != m.digest]
+            if not members_to_send:
+                logger.info("data of {} unchanged since its last binarization, skipping".format(data_set.name))
+                return None
         else:
-            containers[0].exec_run('mkdir ' + input_path)
-
-        # Have the last reload time by Kraken
-        last_reload_time = get_last_coverage_loaded_time(cov=data_set.name)
-
-        def put_data(data_type, file_suffix, zipped):
-            path = '{}/{}/{}'.format(data_path, data_set.name, data_type)
-            zip_file = '{}/{}_{}.zip'.format(path, data_set.name, data_type)
-
-            if os.path.exists(path):
-                logger.info('putting {} data : {}'.format(data_type, path))
-                # get all the files names
-                files = [f for f in os.listdir(path)
-                         if f.endswith(file_suffix)]
-
-                if zipped:
-                    # put them into a zip
-                    with zipfile.ZipFile(zip_file, 'w') as zip:
-                        for f in files:
-                            zip.write('{}/{}'.format(path, f), arcname=f)
-
-                # put the zip into a tar
-                with tarfile.open("./{}.tar".format(data_type), "w") as tar:
-                    if zipped:
-                        tar.add(zip_file, arcname='{}.zip'.format(data_type))
-                    else:
-                        for f in files:
-                            tar.add('{}/{}'.format(path, f), arcname=f)
-
-                # send the tar to the volume
-                with open('./{}.tar'.format(data_type), 'rb') as f:
-                    containers[0].put_archive(input_path, f.read())
-            else:
-                logger.warning('{} path does not exist : {}'.format(data_type, path))
+            members_to_send = members
 
-        # put the fusio data
-        put_data('fusio', '.txt', zipped=True)
-        # put the osm data
-        put_data('osm', '.pbf', zipped=False)
+        # Have the last reload time by Kraken (and follow its container before the data are sent)
+        watch = KrakenReloadWatch(data_set)
 
-        # put the poi data
-        put_data('poi', '.txt', zipped=True)
-        put_data('fusio-poi', '.txt', zipped=True)
+        logger.info('putting data : {}'.format(', '.join(m.arcname for m in members_to_send)))
+        upload_begin = time.time()
+        with timings.timed('data upload', label=data_set.name):
+            # the old data are removed in the same exec as the one putting the new ones
+            store.put(members_to_send, input_path, before=[cls.remove_data_command(data_set)], force=force)
+        watch.uploaded(upload_begin)
 
-        # put the geopal data
-        put_data('geopal', '.txt', zipped=True)
-        put_data('fusio-geopal', '.txt', zipped=True)
-        put_data('fusio-address', '.txt', zipped=True)
+        return watch
 
-        # Wait until data is reloaded
-        wait_for_kraken_reload(last_reload_time, data_set.name)
+    @classmethod
+    @tracer.traced()
+    def wait_for_data_reload(cls, watch):
+        # wait 5 min at most
+        watch.wait(timeout=300)
 
+        cls.get_data_store().write_manifest(watch.data_set.name, cls.data_members(watch.data_set))
 
     @classmethod
-    def kill_the_krakens(cls):
-        for data_set in cls.data_sets:
-            logger.debug("Restarting the Kraken {}".format(data_set.name))
-            containers = [x for x in docker.DockerClient(version='auto').containers.list() if data_set.name in x.name]
-            if not containers:
-                logger.error("No Docker Container found for Kraken {}".format(data_set.name))
-            else:
-                containers[0].restart()
+    def kill_the_krakens(cls, data_sets=None, reason='asked by the test'):
+        """
+        restart the kraken containers (all the fixture's ones by default)
+        """
+        data_sets = cls.data_sets if data_sets is None else data_sets
+        cls.restart_krakens([(data_set, reason) for data_set in data_sets])
+
+    @classmethod
+    @tracer.traced()
+    def restart_krakens(cls, restarts):
+        """
+        restart the kraken containers, all at once
+
+        :param restarts: list of (data set, reason of the restart)
+        """
+        def restart_kraken(restart):
+            data_set, reason = restart
+            logger.info("Restarting the Kraken {}: {}".format(data_set.name, reason))
+            with timings.timed('kraken restart', label=data_set.name, reason=reason):
+                containers.kraken(data_set.name).restart()
+
+        utils.run_concurrently(restart_kraken, restarts)
+
+        data_sets = [data_set for data_set, _ in restarts]
+        services.stopped(data_sets)
+        services.started(data_sets)
+        if services.realtime_dirty:
+            # the restarted krakens have loaded the realtime data still in the kirin database
+            for data_set in data_sets:
+                services.mark_dirty(data_set.name, 'realtime data loaded from kirin at startup')
 
     @classmethod
     def pop_krakens(cls):
@@ -179,62 +375,102 @@ class ArtemisTestFixture(CommonTestFixture):
         """
         pass
 
-    @retry(stop_max_delay=25000, wait_fixed=500)
-    def get_last_rt_loaded_time(self, cov):
-        _res, _, status_code = utils.request("coverage/{cov}/status".format(cov=cov))
-
-        if status_code == 503:
-            raise Exception("Navitia is not available")
-
-        return _res.get('status', {}).get('last_rt_data_loaded', object())
+    @classmethod
+    @tracer.traced()
+    def restart_dirty_krakens(cls):
+        """
+        In Artemis NG, the kraken containers are always running, they are kept warm between the fixtures:
+        only the krakens whose state has been modified (by realtime feeds for example) are restarted
 
-    @retry(stop_max_delay=60000, wait_fixed=500)
-    def wait_for_rt_reload(self, last_rt_data_loaded, cov):
-        logging.warning("waiting for rt reload later than {}".format(last_rt_data_loaded))
-        rt_data_loaded = self.get_last_rt_loaded_time(cov)
+        While the kirin database might hold realtime feeds, a restarted kraken would load them again
+        (and be dirty again): the kirin database is cleaned first, by resetting the realtime
+        """
+        if services.realtime_dirty and services.restart_reasons(cls.data_sets):
+            cls.reset_realtime()
+        reasons = dict(services.restart_reasons(cls.data_sets))
+        cls.restart_krakens([(data_set, reasons[data_set.name])
+                             for data_set in cls.data_sets if data_set.name in reasons])
+        # the krakens not restarted yet are used as they are
+        services.started([data_set for data_set in cls.data_sets if not services.is_running(data_set.name)])
 
-        if last_rt_data_loaded == rt_data_loaded:
-            raise Exception("real time data not loaded")
-        logger.info('RT data reloaded at {}'.format(rt_data_loaded))
+    @classmethod
+    @tracer.traced()
+    def wait_for_krakens(cls):
+        def get_kraken_status(cov):
+            _response, _, _ = utils.request("coverage/{cov}/status".format(cov=cov))
+            return _response.get('status', {}).get('status')
+
+        def wait_for_kraken(data_set):
+            # the status is probed as soon as the kraken logs the end of its data load
+            logs = containers.logs(data_set.name)
+            loaded = logs.listen(config['KRAKEN_LOAD_END_LOG'])
+            try:
+                waiting.wait_for(lambda: get_kraken_status(data_set.name),
+                                 until=lambda status: status == 'running',
+                                 name='kraken start', label=data_set.name,
+                                 timeout=data_set.reload_timeout.total_seconds(), wake=loaded.event)
+            finally:
+                logs.unlisten(loaded)
+
+        utils.run_concurrently(wait_for_kraken, cls.data_sets)
+
+    @tracer.traced()
+    def request_compare(self, url, max_latency_ms=None):
+        if load_test.query_corpus.collecting:
+            return self.collect_query('coverage/{}/{}'.format(self.data_sets[0], url))
 
-    def request_compare(self, url):
         # creating the url
         self.query = config['URL_JORMUN'] + '/v1/coverage/' + str(self.data_sets[0]) + '/' + url
 
+        record = QueryRecord(self.query)
+        # the file name is computed once, its counter is incremented for each call
+        filename = self.get_file_name()
+
         # Get the json answer of the request (it is just a string here)
-        raw_response = requests.get(self.query)
+        with record.timed('latency'):
+            raw_response = requests.get(self.query)
+        record.size = len(raw_response.content)
+        record.status_code = raw_response.status_code
 
         # Transform the string into a dictionary
-        dict_resp = json.loads(raw_response.text)
-
-        if self.create_ref:
-            # Create the reference file
-            self.full_resp = raw_response.text
-            self.create_reference()
-        else:
-            # Comparing my response and my reference
-            self.compare_with_ref(dict_resp)
+        with record.timed('parse'):
+            dict_resp = json.loads(raw_response.text)
 
-    def api(self, url, response_checker=default_checker.default_checker):
+        self.record_latency_budget(record, max_latency_ms)
+        try:
+            if self.create_ref:
+                # Create the reference file
+                self.full_resp = raw_response.text
+                self.create_reference(filename=filename)
+            else:
+                # Comparing my response and my reference
+                self.compare_with_ref(dict_resp, query_record=record, filename=filename)
+                self.check_latency_budget(record)
+                latency_checker.check(filename, record)
+        finally:
+            self.record_query(filename, record)
+
+    def api(self, url, response_checker=default_checker.default_checker, max_latency_ms=None):
         """
         used to check misc API
 
         NOTE: works only when one region is loaded for the moment (when needed change this)
         """
-        return self._api_call(url, response_checker)
+        return self._api_call(url, response_checker, max_latency_ms=max_latency_ms)
 
-    def _api_call(self, url, response_checker):
+    def _api_call(self, url, response_checker, max_latency_ms=None):
         """
         call the api and check against previous results
 
         the query is written in a file
         """
-        self.request_compare(url)
+        self.request_compare(url, max_latency_ms=max_latency_ms)
 
     def journey(self, _from, to, datetime,
                 datetime_represents='departure',
                 first_section_mode=[], last_section_mode=[],
                 forbidden_uris=[],
+                max_latency_ms=None,
                 **kwargs):
         """
         This function is coming from the test_mechanism.py file.
@@ -263,15 +499,16 @@ class ArtemisTestFixture(CommonTestFixture):
             query = "{query}&{k}={v}".format(query=query, k=k, v=v)
 
         # launching request dans comparing
-        self.request_compare('journeys?' + query)
+        self.request_compare('journeys?' + query, max_latency_ms=max_latency_ms)
 
-    def create_reference(self, response_checker=default_checker.default_journey_checker):
+    @tracer.traced()
+    def create_reference(self, response_checker=default_checker.default_journey_checker, filename=None):
         """
         Create the reference file of a test using the response received.
         The file will be created in the git references folder provided in the settings file
         """
         # Check that the file doesn't already exist
-        filename = self.get_file_name()
+        filename = filename or self.get_file_name()
         filepath = os.path.join(config['REFERENCE_FILE_PATH'], filename)
 
         if os.path.isfile(filepath):
@@ -289,7 +526,9 @@ class ArtemisTestFixture(CommonTestFixture):
                 ref.write(json.dumps(reference_text, indent=4))
             logger.info("Created reference file : {}".format(filepath))
 
-    def compare_with_ref(self, response, response_checker=default_checker.default_journey_checker):
+    @tracer.traced()
+    def compare_with_ref(self, response, response_checker=default_checker.default_journey_checker,
+                         query_record=None, filename=None):
         """
         Compare the response (which is a dictionary) to the reference
         First, the function retrieves the reference then filters both ref and resp
@@ -321,13 +560,16 @@ class ArtemisTestFixture(CommonTestFixture):
             for line in difflib.unified_diff(reference, response):
                 print_color(line, symbol2color.get(line[0], Colors.DEFAULT))
 
+        record = query_record or QueryRecord(self.query)
+
         # Filtering the answer. (We compare to a reference also filtered with the same filter)
-        filtered_response = response_checker.filter(response)
+        with record.timed('filter'):
+            filtered_response = response_checker.filter(response)
 
         ### Get the reference
 
         # Create the file name
-        filename = self.get_file_name()
+        filename = filename or self.get_file_name()
         filepath = os.path.join(config['REFERENCE_FILE_PATH'], filename)
 
         assert os.path.isfile(filepath), "{} is not a file".format(filepath)
@@ -346,7 +588,8 @@ class ArtemisTestFixture(CommonTestFixture):
 
         ### Compare response and reference
         try:
-            response_checker.compare(filtered_response, filtered_reference)
+            with record.timed('compare'):
+                response_checker.compare(filtered_response, filtered_reference)
         except AssertionError as e:
             # print the assertion error message
             logging.error("Assertion Error: %s" % str(e))
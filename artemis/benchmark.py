@@ -0,0 +1,648 @@
+"""
+Benchmarks of navitia
+
+scaling: the query corpus of each data set (collected with py.test --collect_queries) is replayed
+at increasing concurrency levels, the throughput and the latency of each level are charted
+and the saturation knee (the level after which adding workers does not bring more throughput) is found:
+
+    python -m artemis.benchmark scaling queries.jsonl --levels 1,2,4,8,16,32 --duration 30 --output scaling.json
+
+realtime: COTS feeds are posted to kirin at increasing rates, and the time between the post of each feed
+and the realtime reload of kraken taking it into account (observed with last_rt_data_loaded) is measured.
+The feeds are the trip_* fixtures of the tests, optionally with new random delays.
+The sustained rate is the highest one whose reload lag does not grow during the run:
+
+    python -m artemis.benchmark realtime guichet-unique --rates 0.5,1,2,4 --duration 60 [--mutate_delays]
+
+scenarios: each query of the corpus is called several times with each scenario of its data set
+(forced with _override_scenario, all the calls of a data set being made in a random order at each round),
+the latency ratio of each query between the scenarios and the distribution of those ratios
+(with bootstrap confidence intervals) are reported, as well as the queries dramatically slower with a scenario:
+
+    python -m artemis.benchmark scenarios queries.jsonl --repeat 20 [--scenarios new_default,experimental]
+
+The results are written with the navitia version of each coverage and a description of the host,
+to compare the runs across navitia versions and hardware.
+"""
+import argparse
+import copy
+import datetime
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from artemis import load_test, utils
+from artemis.common_fixture import rt_reloaded_after, send_cots
+from artemis.latency_baseline import bootstrap_median_ratio
+from artemis.query_stats import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVELS = (1, 2, 4, 8, 16, 32)
+_BAR_WIDTH = 40
+
+DEFAULT_RT_RATES = (0.5, 1, 2, 4)
+DEFAULT_RT_FIXTURES = ('trip_delay_9580_tgv.json',)
+_COTS_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S+0000'
+
+DEFAULT_SCENARIOS_REPEAT = 20
+# with less calls by scenario, the confidence intervals of the ratios are too wide to flag a slower query
+MIN_SCENARIOS_REPEAT = 10
+
+
+def find_knee(steps, min_gain=0.1):
+    """
+    saturation knee of a scaling curve: the first level whose next level
+    does not increase the throughput by at least min_gain (relatively)
+
+    return the index of the knee, None if the throughput still scales at the last level
+
+    >>> find_knee([{'throughput': 10}, {'throughput': 19}, {'throughput': 30}, {'throughput': 31}])
+    2
+    >>> find_knee([{'throughput': 10}, {'throughput': 20}]) is None
+    True
+    """
+    for i, (step, next_step) in enumerate(zip(steps, steps[1:])):
+        if not step['throughput'] or next_step['throughput'] < step['throughput'] * (1 + min_gain):
+            return i
+    return None
+
+
+def run_scaling(urls, levels=DEFAULT_LEVELS, duration=30, min_gain=0.1):
+    """
+    replay the urls with each concurrency level during 'duration' seconds
+    """
+    steps = []
+    for level in levels:
+        logger.info("replaying {} queries with {} workers".format(len(urls), level))
+        samples, elapsed = load_test.run_closed_loop(urls, concurrency=level, duration=duration)
+        step = OrderedDict([('concurrency', level)])
+        step.update(load_test.summarize(samples, elapsed))
+        steps.append(step)
+
+    curve = OrderedDict([('steps', steps), ('knee', None)])
+    knee = find_knee(steps, min_gain)
+    if knee is not None:
+        curve['knee'] = steps[knee]['concurrency']
+    return curve
+
+
+def chart(name, curve, out=None):
+    """
+    ascii chart of the throughput of a scaling curve, with the latencies of each level
+
+    >>> chart('idfm', {'knee': 2, 'steps': [
+    ...     {'concurrency': 1, 'throughput': 10., 'p50_ms': 100., 'p99_ms': 120.},
+    ...     {'concurrency': 2, 'throughput': 20., 'p50_ms': 100., 'p99_ms': 130.},
+    ...     {'concurrency': 4, 'throughput': 20., 'p50_ms': 200., 'p99_ms': 250.}]})
+    idfm
+       1 | ####################                         10.0 req/s  p50    100.0ms  p99    120.0ms
+       2 | ########################################     20.0 req/s  p50    100.0ms  p99    130.0ms  <- knee
+       4 | ########################################     20.0 req/s  p50    200.0ms  p99    250.0ms
+    """
+    out = out or sys.stdout
+    out.write(name + '\n')
+    max_throughput = max(s['throughput'] or 0 for s in curve['steps']) or 1
+    for s in curve['steps']:
+        bar = '#' * int(round(_BAR_WIDTH * (s['throughput'] or 0) / max_throughput))
+        line = "{:>4} | {:<{width}} {:>8.1f} req/s  p50 {:>8.1f}ms  p99 {:>8.1f}ms".format(
+            s['concurrency'], bar, s['throughput'] or 0, s['p50_ms'] or 0, s['p99_ms'] or 0, width=_BAR_WIDTH)
+        if s['concurrency'] == curve['knee']:
+            line += '  <- knee'
+        out.write(line + '\n')
+
+
+def coverage_status(data_set, root=None):
+    """
+    status of the coverage, called on the same root of the api as the benchmarked queries
+    """
+    response = requests.get(load_test.query_url({'url': 'coverage/{}/status'.format(data_set)}, root=root))
+    if response.status_code == 503:
+        raise Exception("Navitia is not available")
+    return response.json().get('status', {})
+
+
+def navitia_version(data_set, root=None):
+    try:
+        return coverage_status(data_set, root=root).get('navitia_version')
+    except Exception as e:
+        logger.warning("impossible to get the navitia version of {}: {}".format(data_set, e))
+        return None
+
+
+def environment():
+    """
+    description of the benchmark run, to compare the results across versions and hardware
+    """
+    return OrderedDict([('date', datetime.datetime.utcnow().isoformat()),
+                        ('host', socket.gethostname()),
+                        ('platform', platform.platform()),
+                        ('cpu_count', multiprocessing.cpu_count()),
+                        ('python', platform.python_version())])
+
+
+def scaling(args):
+    queries = load_test.read_corpus(args.corpus, data_sets=args.data_set, scenarios=args.scenario)
+    assert queries, "no query to replay in {}".format(args.corpus)
+    by_data_set = OrderedDict()
+    for q in queries:
+        by_data_set.setdefault(q['data_set'], []).append(
+            load_test.query_url(q, root=args.url, override_scenario=args.override_scenario))
+
+    results = OrderedDict([('environment', environment()),
+                           ('levels', args.levels),
+                           ('duration', args.duration),
+                           ('coverages', OrderedDict())])
+    for data_set, urls in by_data_set.items():
+        curve = OrderedDict([('navitia_version', navitia_version(data_set, root=args.url)), ('queries', len(urls))])
+        curve.update(run_scaling(urls, levels=args.levels, duration=args.duration, min_gain=args.min_gain))
+        results['coverages'][data_set] = curve
+        chart(data_set, curve)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2))
+        logger.info("scaling curves written in {}".format(args.output))
+    return results
+
+
+def mutate_delays(feed, delay, now=None):
+    """
+    copy of a COTS feed (as a dict) whose projected times are 'delay' seconds after the theoretical ones,
+    emitted at 'now' (utc) so that kirin takes it as a new version of the trip
+
+    >>> feed = {'nouvelleVersion': {'dateDerniereModification': '2012-11-20T08:35:06+0000', 'listePointDeParcours': [
+    ...     {'horaireVoyageurDepart': {'dateHeure': '2012-11-20T13:40:00+0000'},
+    ...      'listeHoraireProjeteDepart': [{'dateHeure': '2012-11-20T13:50:00+0000', 'pronosticIV': 600,
+    ...                                     'pronosticBrut': 600, 'dateHeureEmission': '2012-11-20T08:35:06+0000'}],
+    ...      'listeHoraireProjeteArrivee': []}]}}
+    >>> new = mutate_delays(feed, 300, now=datetime.datetime(2012, 11, 20, 9))
+    >>> projected = new['nouvelleVersion']['listePointDeParcours'][0]['listeHoraireProjeteDepart'][0]
+    >>> projected['dateHeure'], projected['pronosticIV'], projected['dateHeureEmission']
+    ('2012-11-20T13:45:00+0000', 300, '2012-11-20T09:00:00+0000')
+    """
+    emitted_at = (now or datetime.datetime.utcnow()).strftime(_COTS_DATETIME_FORMAT)
+    feed = copy.deepcopy(feed)
+    version = feed['nouvelleVersion']
+    version['dateDerniereModification'] = emitted_at
+    for point in version.get('listePointDeParcours', []):
+        for direction in ('Arrivee', 'Depart'):
+            theoretical = point.get('horaireVoyageur' + direction)
+            for projected in point.get('listeHoraireProjete' + direction, []):
+                base = datetime.datetime.strptime(theoretical['dateHeure'], _COTS_DATETIME_FORMAT)
+                projected['dateHeure'] = (base + datetime.timedelta(seconds=delay)).strftime(_COTS_DATETIME_FORMAT)
+                projected['pronosticIV'] = projected['pronosticBrut'] = delay
+                projected['dateHeureEmission'] = emitted_at
+    return feed
+
+
+def realtime_feeds(fixtures, mutate=False, max_delay=30, seed=None):
+    """
+    endless stream of (fixture name, COTS feed as a string), the fixtures being sent in turn
+
+    with mutate, each feed is given a new random delay (in minutes, up to max_delay)
+    """
+    rng = random.Random(seed)
+    feeds = [(name, utils.get_rt_data(name)) for name in fixtures]
+    while True:
+        for name, feed in feeds:
+            if mutate:
+                feed = json.dumps(mutate_delays(json.loads(feed), rng.randint(1, max_delay) * 60))
+            yield name, feed
+
+
+def lag_growth(lags):
+    """
+    relative growth of the reload lag during a run:
+    the median lag of the last third of the feeds compared with the one of the first third
+
+    >>> round(lag_growth([1, 1, 1, 2, 2, 2, 3, 3, 3]), 2)
+    2.0
+    >>> lag_growth([1, 2]) is None
+    True
+    """
+    third = len(lags) // 3
+    if not third:
+        return None
+    first, last = percentile(lags[:third], 50), percentile(lags[-third:], 50)
+    return last / first - 1 if first else None
+
+
+def run_realtime(coverage, feeds, rate, duration, root=None, poll_interval=0.1, drain_timeout=60):
+    """
+    post the feeds to kirin at 'rate' feeds per second during 'duration' seconds,
+    and measure for each one the time until kraken has reloaded its realtime data after it
+    (observed on the status of the coverage, on the given root of the api)
+
+    a reload covers the feeds posted before the status request that reported it, and whose post began
+    before the load time given by kraken (see rt_reloaded_after, there is no allowance for a clock skew).
+    If kraken does not give a valid load time, a reload only covers the feeds posted before the previous
+    request of the status, since it happened after it
+    """
+    pending = []
+    applied = []
+    post_errors = []
+    reloads = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    first_asked_at = time.time()
+    last_rt_data_loaded = coverage_status(coverage, root=root).get('last_rt_data_loaded')
+
+    def poll():
+        # the previous value of last_rt_data_loaded was loaded before the status was asked for,
+        # so a change observed since happened after previous_asked_at
+        last, previous_asked_at = last_rt_data_loaded, first_asked_at
+        while not stop.is_set():
+            asked_at = time.time()
+            try:
+                rt_data_loaded = coverage_status(coverage, root=root).get('last_rt_data_loaded')
+            except Exception as e:
+                logger.debug("status of {} not available: {}".format(coverage, e))
+                stop.wait(poll_interval)
+                continue
+            seen_at = time.time()
+            if rt_data_loaded != last:
+                last = rt_data_loaded
+                reloads.append(seen_at)
+
+                def covered(f):
+                    if f['posted_at'] >= asked_at:
+                        # posted after the status has been asked for, it cannot be in this reload
+                        return False
+                    reloaded_after = rt_reloaded_after(rt_data_loaded, f['posted_at'])
+                    if reloaded_after is None:
+                        return f['posted_at'] < previous_asked_at
+                    return reloaded_after
+
+                with lock:
+                    for f in [f for f in pending if covered(f)]:
+                        pending.remove(f)
+                        f['lag'] = seen_at - f['posted_at']
+                        applied.append(f)
+            previous_asked_at = asked_at
+            stop.wait(poll_interval)
+
+    poller = threading.Thread(target=poll, name='rt reload poller')
+    poller.daemon = True
+    poller.start()
+
+    begin = time.time()
+    for offset in load_test.arrival_offsets(rate, duration):
+        delay = begin + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        name, feed = next(feeds)
+        posted_at = time.time()
+        try:
+            send_cots(feed)
+        except requests.RequestException as e:
+            post_errors.append(str(e))
+            continue
+        with lock:
+            pending.append({'fixture': name,
+                            'posted_at': posted_at,
+                            'post': time.time() - posted_at})
+    sent_duration = time.time() - begin
+
+    deadline = time.time() + drain_timeout
+    while time.time() < deadline:
+        with lock:
+            if not pending:
+                break
+        time.sleep(poll_interval)
+    stop.set()
+    poller.join()
+
+    return {'rate': rate,
+            'duration': sent_duration,
+            'applied': sorted(applied, key=lambda f: f['posted_at']),
+            'unapplied': len(pending),
+            'post_errors': post_errors,
+            'reloads': len(reloads)}
+
+
+def summarize_realtime(run, max_lag_growth=0.5):
+    """
+    reload lags (in seconds) of a realtime run, and whether the rate is sustained
+    """
+    lags = [f['lag'] for f in run['applied']]
+    sent = len(lags) + run['unapplied']
+    res = OrderedDict()
+    res['rate'] = run['rate']
+    res['sent'] = sent
+    res['post_rate'] = sent / run['duration'] if run['duration'] else None
+    res['post_errors'] = len(run['post_errors'])
+    res['applied'] = len(lags)
+    res['unapplied'] = run['unapplied']
+    res['reloads'] = run['reloads']
+    res['post_p50'] = percentile([f['post'] for f in run['applied']], 50)
+    for p in (50, 90, 99):
+        res['lag_p{}'.format(p)] = percentile(lags, p)
+    res['lag_max'] = max(lags) if lags else None
+    res['lag_growth'] = lag_growth(lags)
+    res['sustained'] = bool(lags) and not run['unapplied'] and (res['lag_growth'] or 0) <= max_lag_growth
+    return res
+
+
+def print_realtime_summary(summary, out=None):
+    out = out or sys.stdout
+    line = ("{rate:>6} feeds/s | sent {sent:>4}  applied {applied:>4}  reloads {reloads:>4}  "
+            "lag p50 {p50:>6.2f}s  p90 {p90:>6.2f}s  max {max:>6.2f}s  growth {growth:>+7.0%}").format(
+        p50=summary['lag_p50'] or 0, p90=summary['lag_p90'] or 0, max=summary['lag_max'] or 0,
+        growth=summary['lag_growth'] or 0, **summary)
+    if not summary['sustained']:
+        line += '  <- not sustained'
+    out.write(line + '\n')
+
+
+def realtime(args):
+    feeds = realtime_feeds(args.fixture or DEFAULT_RT_FIXTURES, mutate=args.mutate_delays,
+                           max_delay=args.max_delay, seed=args.seed)
+    results = OrderedDict([('environment', environment()),
+                           ('coverage', args.coverage),
+                           ('navitia_version', navitia_version(args.coverage, root=args.url)),
+                           ('fixtures', list(args.fixture or DEFAULT_RT_FIXTURES)),
+                           ('mutate_delays', args.mutate_delays),
+                           ('duration', args.duration),
+                           ('steps', []),
+                           ('sustained_rate', None)])
+    for rate in args.rates:
+        logger.info("sending {} feeds/s to {} during {}s".format(rate, args.coverage, args.duration))
+        run = run_realtime(args.coverage, feeds, rate, args.duration, root=args.url,
+                           poll_interval=args.poll_interval, drain_timeout=args.drain_timeout)
+        summary = summarize_realtime(run, max_lag_growth=args.max_lag_growth)
+        results['steps'].append(summary)
+        print_realtime_summary(summary)
+        if not summary['sustained']:
+            break
+        results['sustained_rate'] = summary['post_rate']
+
+    logger.info("sustained realtime feed rate on {}: {}".format(args.coverage, results['sustained_rate']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2))
+        logger.info("realtime benchmark written in {}".format(args.output))
+    return results
+
+
+def scenario_free_url(url):
+    """
+    url of a query of the corpus without the scenario it may have been forced on
+
+    >>> scenario_free_url('coverage/idfm/journeys?from=a&_override_scenario=distributed&to=b')
+    'coverage/idfm/journeys?from=a&to=b'
+    >>> scenario_free_url('coverage/idfm/journeys?_override_scenario=distributed')
+    'coverage/idfm/journeys'
+    """
+    url = re.sub(r'([?&])_override_scenario=[^&]*&?', r'\1', url)
+    return url.rstrip('?&')
+
+
+def paired_queries(queries, scenarios=None):
+    """
+    the distinct queries of each data set, with the scenarios to compare on them
+    (the given ones, or the ones the data set is tested with, in their order of appearance)
+
+    return a dict data set -> (scenarios, urls)
+
+    >>> queries = [{'data_set': 'idfm', 'scenario': 'new_default', 'url': 'journeys?a'},
+    ...            {'data_set': 'idfm', 'scenario': 'experimental', 'url': 'journeys?a'},
+    ...            {'data_set': 'tcl', 'scenario': 'new_default', 'url': 'journeys?b'}]
+    >>> dict(paired_queries(queries))
+    {'idfm': (['new_default', 'experimental'], ['journeys?a'])}
+    """
+    by_data_set = OrderedDict()
+    for q in queries:
+        data_set_scenarios, urls = by_data_set.setdefault(q['data_set'], ([], []))
+        if q['scenario'] not in data_set_scenarios:
+            data_set_scenarios.append(q['scenario'])
+        url = scenario_free_url(q['url'])
+        if url not in urls:
+            urls.append(url)
+
+    res = OrderedDict()
+    for data_set, (data_set_scenarios, urls) in by_data_set.items():
+        data_set_scenarios = scenarios or data_set_scenarios
+        if len(data_set_scenarios) < 2:
+            logger.info("{} is only tested with the scenario {}, skipping it".format(data_set, data_set_scenarios))
+            continue
+        res[data_set] = (data_set_scenarios, urls)
+    return res
+
+
+def run_scenarios(data_set, urls, scenarios, repeat, root=None, session=None, rng=random):
+    """
+    call each query 'repeat' times with each scenario
+
+    at each round, the calls of all the queries with all the scenarios are made in a random order,
+    so that a query is not called right after itself (with warm caches) and the drifts of the
+    server during the run are spread over the scenarios
+
+    return the samples by scenario of each url
+    """
+    session = session or requests.Session()
+    samples = OrderedDict((url, OrderedDict((scenario, []) for scenario in scenarios)) for url in urls)
+    calls = [(url, scenario) for url in urls for scenario in scenarios]
+    for _ in range(repeat):
+        for url, scenario in rng.sample(calls, len(calls)):
+            query = {'url': url, 'data_set': data_set, 'scenario': scenario}
+            samples[url][scenario].append(load_test.call(session, load_test.query_url(query, root=root,
+                                                                                      override_scenario=True)))
+    return samples
+
+
+def compare_query(url, baseline_samples, samples):
+    """
+    latency ratio of a query between a scenario and the baseline scenario, with its bootstrap confidence interval
+    """
+    res = OrderedDict([('url', url)])
+    failed = [s for s in baseline_samples + samples if s.failed]
+    if failed:
+        res['errors'] = sorted(set(s.error or str(s.status_code) for s in failed))
+        return res
+    latencies = [s.latency for s in samples]
+    baseline_latencies = [s.latency for s in baseline_samples]
+    res['median_ms'] = percentile(latencies, 50) * 1000
+    res['baseline_median_ms'] = percentile(baseline_latencies, 50) * 1000
+    res['ratio'], res['low'], res['high'] = bootstrap_median_ratio(latencies, baseline_latencies)
+    return res
+
+
+def ratio_distribution(ratios, resamples=2000, confidence=0.95, seed=0):
+    """
+    geometric mean and median of the latency ratios of the queries, with their bootstrap confidence intervals,
+    and the spread of the ratios
+
+    >>> d = ratio_distribution([2., 2., 2., 2.])
+    >>> round(d['geometric_mean'][0], 2), round(d['median'][1], 2), d['slower'], d['faster']
+    (2.0, 2.0, 4, 0)
+    """
+    import numpy as np
+
+    log_ratios = np.log(np.asarray(ratios, dtype=float))
+    rng = np.random.RandomState(seed)
+    resampled = rng.choice(log_ratios, (resamples, log_ratios.size))
+    alpha = (1 - confidence) / 2 * 100
+
+    def with_interval(value, statistics):
+        return [float(np.exp(value)),
+                float(np.exp(np.percentile(statistics, alpha))),
+                float(np.exp(np.percentile(statistics, 100 - alpha)))]
+
+    return OrderedDict([('count', int(log_ratios.size)),
+                        ('geometric_mean', with_interval(log_ratios.mean(), resampled.mean(axis=1))),
+                        ('median', with_interval(np.median(log_ratios), np.median(resampled, axis=1))),
+                        ('p10', float(np.exp(np.percentile(log_ratios, 10)))),
+                        ('p90', float(np.exp(np.percentile(log_ratios, 90)))),
+                        ('slower', int((log_ratios > 0).sum())),
+                        ('faster', int((log_ratios < 0).sum()))])
+
+
+def dramatically_slower(comparisons, factor):
+    """
+    the queries whose latency ratio is, with confidence, above the factor
+
+    >>> [c['url'] for c in dramatically_slower([{'url': 'a', 'ratio': 3., 'low': 2.5, 'high': 3.5},
+    ...                                          {'url': 'b', 'ratio': 2.5, 'low': 0.9, 'high': 4.},
+    ...                                          {'url': 'c', 'ratio': 1., 'low': 0.9, 'high': 1.1}], 2)]
+    ['a']
+    """
+    return sorted((c for c in comparisons if c.get('low', 0) > factor), key=lambda c: c['ratio'], reverse=True)
+
+
+def print_scenarios_report(data_set, baseline, scenario, report, out=None):
+    out = out or sys.stdout
+    d = report['distribution']
+    out.write("{}: {} compared with {} on {} queries\n".format(data_set, scenario, baseline, d['count']))
+    for name in ('geometric_mean', 'median'):
+        out.write("  {:<22} {:.2f}x (95% CI {:.2f}x - {:.2f}x)\n".format(name.replace('_', ' ') + ' ratio:', *d[name]))
+    out.write("  {:<22} {:.2f}x / {:.2f}x\n".format('ratio p10 / p90:', d['p10'], d['p90']))
+    out.write("  {} slower on {} queries, faster on {}\n".format(scenario, d['slower'], d['faster']))
+    if report['failed']:
+        out.write("  {} queries failed and are not compared\n".format(len(report['failed'])))
+    for slower, name in ((report['slower'], scenario), (report['faster'], baseline)):
+        if slower:
+            out.write("  dramatically slower with {}:\n".format(name))
+        for c in slower:
+            out.write("    {:>6.2f}x  ({} {:.1f}ms, {} {:.1f}ms)  {}\n".format(
+                c['ratio'], scenario, c['median_ms'], baseline, c['baseline_median_ms'], c['url']))
+
+
+def scenarios(args):
+    queries = load_test.read_corpus(args.corpus, data_sets=args.data_set)
+    assert queries, "no query in {}".format(args.corpus)
+    rng = random.Random(args.seed)
+    session = requests.Session()
+    if args.repeat < MIN_SCENARIOS_REPEAT:
+        logger.warning("with --repeat {} (less than {}), the latency ratios are too uncertain "
+                       "to flag the dramatically slower queries".format(args.repeat, MIN_SCENARIOS_REPEAT))
+
+    results = OrderedDict([('environment', environment()),
+                           ('repeat', args.repeat),
+                           ('coverages', OrderedDict())])
+    for data_set, (data_set_scenarios, urls) in paired_queries(queries, args.scenarios).items():
+        logger.info("comparing the scenarios {} on {} queries of {}".format(data_set_scenarios, len(urls), data_set))
+        samples = run_scenarios(data_set, urls, data_set_scenarios, args.repeat, root=args.url,
+                                session=session, rng=rng).items()
+
+        baseline = data_set_scenarios[0]
+        coverage = OrderedDict([('navitia_version', navitia_version(data_set, root=args.url)),
+                                ('baseline', baseline),
+                                ('scenarios', OrderedDict())])
+        for scenario in data_set_scenarios[1:]:
+            comparisons = [compare_query(url, s[baseline], s[scenario]) for url, s in samples]
+            compared = [c for c in comparisons if 'ratio' in c]
+            if not compared:
+                logger.warning("no query of {} succeeded with {} and {}".format(data_set, baseline, scenario))
+                continue
+            # the queries dramatically faster with the scenario are the ones dramatically slower with the baseline
+            inverted = [dict(c, ratio=1 / c['ratio'], low=1 / c['high'], high=1 / c['low']) for c in compared]
+            report = OrderedDict([('distribution', ratio_distribution([c['ratio'] for c in compared])),
+                                  ('slower', dramatically_slower(compared, args.slower_factor)),
+                                  ('faster', dramatically_slower(inverted, args.slower_factor)),
+                                  ('failed', [c for c in comparisons if 'errors' in c]),
+                                  ('queries', comparisons)])
+            coverage['scenarios'][scenario] = report
+            print_scenarios_report(data_set, baseline, scenario, report)
+        results['coverages'][data_set] = coverage
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2))
+        logger.info("scenarios comparison written in {}".format(args.output))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmarks of navitia")
+    subparsers = parser.add_subparsers(dest='benchmark')
+    # the sub commands are optional by default with python 3
+    subparsers.required = True
+
+    scaling_parser = subparsers.add_parser('scaling', help="throughput and latency at increasing concurrency levels")
+    load_test.add_corpus_arguments(scaling_parser)
+    scaling_parser.add_argument('--levels', type=lambda s: [int(l) for l in s.split(',')], default=DEFAULT_LEVELS,
+                                help="comma separated concurrency levels (default: 1,2,4,8,16,32)")
+    scaling_parser.add_argument('--duration', type=float, default=30, help="duration of each level in seconds")
+    scaling_parser.add_argument('--min_gain', type=float, default=0.1,
+                                help="minimal relative throughput gain of a level below which the curve is saturated")
+    scaling_parser.add_argument('--output', default=None, help="write the results in this json file")
+    scaling_parser.set_defaults(func=scaling)
+
+    realtime_parser = subparsers.add_parser('realtime', help="realtime reload lag at increasing COTS feed rates")
+    realtime_parser.add_argument('coverage', help="coverage whose kraken receives the feeds (ex: guichet-unique)")
+    realtime_parser.add_argument('--rates', type=lambda s: [float(r) for r in s.split(',')], default=DEFAULT_RT_RATES,
+                                 help="comma separated feed rates in feeds per second (default: 0.5,1,2,4), "
+                                      "the benchmark stops at the first rate not sustained")
+    realtime_parser.add_argument('--duration', type=float, default=60, help="duration of each rate in seconds")
+    realtime_parser.add_argument('--fixture', action='append',
+                                 help="COTS fixture sent (can be repeated, default: trip_delay_9580_tgv.json)")
+    realtime_parser.add_argument('--mutate_delays', action='store_true',
+                                 help="give a new random delay to each feed sent")
+    realtime_parser.add_argument('--max_delay', type=int, default=30, help="maximum random delay in minutes")
+    realtime_parser.add_argument('--seed', type=int, default=None, help="seed of the random delays")
+    realtime_parser.add_argument('--max_lag_growth', type=float, default=0.5,
+                                 help="relative growth of the reload lag during a run above which the rate "
+                                      "is not sustained")
+    realtime_parser.add_argument('--poll_interval', type=float, default=0.1,
+                                 help="interval between the checks of last_rt_data_loaded in seconds")
+    realtime_parser.add_argument('--drain_timeout', type=float, default=60,
+                                 help="time given to kraken to load the last feeds of a rate in seconds")
+    realtime_parser.add_argument('--url', default=None,
+                                 help="root of the api where the status of the coverage is followed "
+                                      "(by default URL_JORMUN/v1/), the feeds are posted to KIRIN_API")
+    realtime_parser.add_argument('--output', default=None, help="write the results in this json file")
+    realtime_parser.set_defaults(func=realtime)
+
+    scenarios_parser = subparsers.add_parser('scenarios', help="latency of the same queries with each scenario")
+    scenarios_parser.add_argument('corpus', help="file of the queries collected with py.test --collect_queries")
+    scenarios_parser.add_argument('--data_set', action='append',
+                                  help="only the queries on this data set (can be repeated)")
+    scenarios_parser.add_argument('--scenarios', type=lambda s: s.split(','), default=None,
+                                  help="comma separated scenarios to compare, the first one being the baseline "
+                                       "(default: the scenarios each data set is tested with)")
+    scenarios_parser.add_argument('--repeat', type=int, default=DEFAULT_SCENARIOS_REPEAT,
+                                  help="number of calls of each query by scenario (default: 20)")
+    scenarios_parser.add_argument('--slower_factor', type=float, default=2.,
+                                  help="latency ratio above which a query is dramatically slower with a scenario")
+    scenarios_parser.add_argument('--seed', type=int, default=None, help="seed of the order of the calls")
+    scenarios_parser.add_argument('--url', default=None, help="root of the api (by default URL_JORMUN/v1/)")
+    scenarios_parser.add_argument('--output', default=None, help="write the results in this json file")
+    scenarios_parser.set_defaults(func=scenarios)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
+import datetime
 import logging
 import inspect
-import psycopg2
+import os
+import time
+import warnings
 import requests
 
 import artemis.utils as utils
+from artemis import load_test, query_stats, waiting
+from artemis.db import Database, DatabaseCleaner
+from artemis.timing import timings
+from artemis.tracing import tracer
 
 from artemis.configuration_manager import config
+from artemis.service_manager import services
 
 logger = logging.getLogger(__name__)
 
@@ -16,28 +24,94 @@ def truncate_tables(cursor, table_names_string):
     cursor.execute("TRUNCATE {} CASCADE ;".format(table_names_string))
 
 
-# the time cost is around 1.3s on artemis platform
+kirin_db = Database(config['KIRIN_DB'])
+
+_kirin_db_cleaner = DatabaseCleaner(kirin_db,
+                                    excluded_tables=('alembic_version', 'layer', 'topology'),
+                                    method=config['KIRIN_DB_CLEANING_METHOD'],
+                                    name='kirin db')
+
+
+# the time cost was around 1.3s on artemis platform when connecting and listing the tables each time,
+# the connection and the cleaning queries are now kept for the whole session
 def clean_kirin_db():
     logger.info("cleaning kirin database")
-    conn = psycopg2.connect(config['KIRIN_DB'])
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT relname FROM pg_stat_user_tables WHERE relname != 'alembic_version';")
-        tables = cur.fetchall()
-
-        truncate_tables(cur, ', '.join(e[0] for e in tables if e[0] not in ("layer", "topology")))
-
-        conn.commit()
+        _kirin_db_cleaner.clean()
         logger.debug("kirin db purge done")
     except:
         logger.exception("problem with kirin db")
-        conn.close()
         assert False, "problem while cleaning kirin db"
-    conn.close()
+
+
+def parse_navitia_datetime(value):
+    """
+    parse a date time given by navitia (None if it is not a valid date time)
+
+    >>> parse_navitia_datetime('20190314T190000.123456')
+    datetime.datetime(2019, 3, 14, 19, 0, 0, 123456)
+    >>> parse_navitia_datetime('20190314T190000')
+    datetime.datetime(2019, 3, 14, 19, 0)
+    >>> parse_navitia_datetime(None) is None
+    True
+    """
+    for date_format in ('%Y%m%dT%H%M%S.%f', '%Y%m%dT%H%M%S'):
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def rt_reloaded_after(rt_data_loaded, at):
+    """
+    whether the load time of the realtime data given by kraken (in UTC) is later than 'at' (a timestamp)
+
+    return None if kraken does not give a valid load time
+    kraken gives its load times to the microsecond, but to the second only when the microseconds are 0:
+    such a time is only later than 'at' if it is in a later second
+
+    >>> at = 1552590000.7  # 2019-03-14 19:00:00.7 UTC
+    >>> rt_reloaded_after('20190314T190000.800000', at), rt_reloaded_after('20190314T190000.600000', at)
+    (True, False)
+    >>> rt_reloaded_after('20190314T190000', at), rt_reloaded_after('20190314T190001', at)
+    (False, True)
+    >>> rt_reloaded_after('not a date', at) is None
+    True
+    """
+    loaded_at = parse_navitia_datetime(rt_data_loaded)
+    if loaded_at is None:
+        return None
+    at = datetime.datetime.utcfromtimestamp(at)
+    if '.' not in rt_data_loaded:
+        at = at.replace(microsecond=0)
+    return loaded_at > at
+
+
+def get_last_rt_data_loaded(cov):
+    """
+    return the last time kraken loaded some realtime data
+    """
+    _res, _, status_code = utils.request("coverage/{cov}/status".format(cov=cov))
+
+    if status_code == 503:
+        raise Exception("Navitia is not available")
+
+    return _res.get('status', {}).get('last_rt_data_loaded', object())
+
+
+def send_cots(feed):
+    """
+    post a COTS feed (given as a string) to kirin
+    """
+    r = requests.post(config['KIRIN_API'] + '/cots',
+                      data=feed.encode('UTF-8'),
+                      headers={'Content-Type': 'application/json;charset=utf-8'})
+    r.raise_for_status()
 
 
 class CommonTestFixture(object):
-    def get_file_name(self):
+    def get_file_name(self, scenario=None):
         """
         create the name of the file for storing the query.
 
@@ -47,10 +121,12 @@ class CommonTestFixture(object):
 
         if a custom_name is provided we take it, else we create a md5 on the url.
         a custom_name must be provided is the same call is done twice in the same test function
+
+        the scenario of the fixture's data set is used, unless another one is given
         """
         mro = inspect.getmro(self.__class__)
         class_name = "Test{}".format(mro[1].__name__)
-        scenario = mro[0].data_sets[0].scenario
+        scenario = scenario or mro[0].data_sets[0].scenario
 
         func_name = utils.get_calling_test_function()
         test_name = '{}/{}/{}'.format(class_name, scenario, func_name)
@@ -62,13 +138,138 @@ class CommonTestFixture(object):
         else:
             return "{}.json".format(test_name)
 
+    def record_query(self, filename, record, scenario=None):
+        """
+        keep the measures of a query for the session report, and write them next to its response
+        """
+        record.details['data_set'] = ','.join(d.name for d in self.data_sets)
+        record.details['scenario'] = scenario or self.data_sets[0].scenario
+        record.details['file'] = filename
+        query_stats.query_stats.add(record)
+
+        file_complete_path = os.path.join(config['RESPONSE_FILE_PATH'], filename)
+        if not os.path.exists(os.path.dirname(file_complete_path)):
+            os.makedirs(os.path.dirname(file_complete_path))
+        query_stats.write_record(query_stats.stats_file_path(file_complete_path), record)
+
+    def collect_query(self, url, scenario=None):
+        """
+        keep the query for the load tests instead of calling navitia (--collect_queries)
+
+        :param url: url of the query, relative to the root of the api
+        """
+        scenario = scenario or self.data_sets[0].scenario
+        load_test.query_corpus.add(url,
+                                   data_set=','.join(d.name for d in self.data_sets),
+                                   scenario=scenario,
+                                   filename=self.get_file_name(scenario=scenario))
+
+    def init_latency_budget(self, request):
+        """
+        read the latency budget of the test, given by the marker @pytest.mark.max_latency_ms(<ms>)
+        """
+        # get_closest_marker appeared in pytest 3.6, get_marker has been removed since
+        get_marker = getattr(request.node, 'get_closest_marker', None) or request.node.get_marker
+        marker = get_marker('max_latency_ms')
+        self.test_max_latency_ms = marker.args[0] if marker else None
+
+    def latency_budget(self, max_latency_ms=None):
+        """
+        latency budget of a query, in milliseconds: the one given for the call,
+        else the one of the test, else the smallest one of the data sets
+        """
+        if max_latency_ms is not None:
+            return max_latency_ms
+        if getattr(self, 'test_max_latency_ms', None) is not None:
+            return self.test_max_latency_ms
+        budgets = [d.max_latency_ms for d in self.data_sets if getattr(d, 'max_latency_ms', None) is not None]
+        return min(budgets) if budgets else None
+
+    def record_latency_budget(self, record, max_latency_ms=None):
+        """
+        keep the budget of the query in the details of the record, next to the measured latency
+
+        it is done before the response is checked, so the budget is reported even if the check fails
+        """
+        budget = self.latency_budget(max_latency_ms)
+        if budget is not None:
+            record.details['max_latency_ms'] = budget
+
+    def check_latency_budget(self, record):
+        """
+        fail (or warn, depending on LATENCY_BUDGET_MODE) if the query took longer than its recorded budget
+        """
+        budget = record.details.get('max_latency_ms')
+        if budget is None:
+            return
+
+        latency_ms = record.latency * 1000
+        if latency_ms <= budget:
+            return
+
+        message = "query {} took {:.1f}ms, over its budget of {}ms".format(record.url, latency_ms, budget)
+        if config['LATENCY_BUDGET_MODE'] == 'fail':
+            assert False, message
+        logger.warning(message)
+        warnings.warn(message)
+
+    @staticmethod
+    def clean_realtime():
+        """
+        empty the kirin database if some realtime feeds might have been sent since its last cleaning
+
+        called before the krakens of a fixture are started, they are then known to have no realtime data
+        and the first reset_realtime of the fixture does not restart them
+        """
+        if not services.realtime_dirty:
+            logger.debug("no realtime feed sent since last cleaning of the kirin database")
+            return
+
+        clean_kirin_db()
+        services.realtime_dirty = False
+
+    @classmethod
+    @tracer.traced()
+    def reset_realtime(cls):
+        """
+        Go back to the base schedule: empty the kirin database and restart the krakens
+        (they load the realtime data from kirin at startup)
+
+        The kirin database is emptied only if some realtime feeds might have been sent since the last cleaning,
+        and only the krakens that might have some realtime data are restarted
+        """
+        cls.clean_realtime()
+        unclean = services.realtime_unclean(cls.data_sets)
+        if not unclean:
+            logger.debug("no realtime data in the krakens, nothing to reset")
+            return
+
+        cls.kill_the_krakens(unclean, reason='realtime data possibly loaded before the kirin database cleaning')
+        cls.pop_krakens()
+        cls.wait_for_krakens()
+
     @staticmethod
     def _send_cots(cots_file_name):
-        r = requests.post(config['KIRIN_API'] + '/cots',
-                          data=utils.get_rt_data(cots_file_name).encode('UTF-8'),
-                          headers={'Content-Type': 'application/json;charset=utf-8'})
-        r.raise_for_status()
+        services.realtime_dirty = True
+        send_cots(utils.get_rt_data(cots_file_name))
+
+    def get_last_rt_loaded_time(self, cov):
+        if self.check_ref:
+            return
 
+        return waiting.wait_for(lambda: get_last_rt_data_loaded(cov),
+                                name='navitia availability', label=cov, timeout=25)
+
+    def wait_for_rt_reload(self, last_rt_data_loaded, cov):
+        if self.check_ref:
+            return
+
+        rt_data_loaded = waiting.wait_for(lambda: get_last_rt_data_loaded(cov),
+                                          until=lambda loaded: loaded != last_rt_data_loaded,
+                                          name='rt reload', label=cov, timeout=60)
+        logger.info('RT data reloaded at {}'.format(rt_data_loaded))
+
+    @tracer.traced()
     def send_and_wait(self, rt_file_name):
         """
         Send a COTS and wait until the data is reloaded
@@ -80,6 +281,50 @@ class CommonTestFixture(object):
         if len(self.data_sets) > 1:
             logger.warning(" >1 data_set for test class !!!")
         coverage = self.data_sets[0].name
+        # the kraken will have to be restarted before being used by another fixture
+        services.mark_dirty(coverage, 'realtime feeds received')
         last_rt_data_loaded = self.get_last_rt_loaded_time(coverage)
         self._send_cots(rt_file_name)
         self.wait_for_rt_reload(last_rt_data_loaded, coverage)
+
+    @tracer.traced()
+    def send_all_and_wait(self, rt_file_names):
+        """
+        Send several COTS, in this order, and wait only once for a reload taking all of them into account
+
+        The status of the coverage is read once the post of the last feed has returned. The reload covers
+        all the feeds when last_rt_data_loaded has changed since, with a load time later than this post
+        (see rt_reloaded_after): a reload that began before the last post cannot meet it.
+        If kraken does not give a valid load time, the change since the last post is considered enough.
+        :param rt_file_names: names of the real-time feed files
+        """
+        if self.check_ref:
+            return
+
+        if len(self.data_sets) > 1:
+            logger.warning(" >1 data_set for test class !!!")
+        coverage = self.data_sets[0].name
+        services.mark_dirty(coverage, 'realtime feeds received')
+
+        sent_at = []
+        for rt_file_name in rt_file_names:
+            with timings.timed('cots post', label=rt_file_name):
+                self._send_cots(rt_file_name)
+            sent_at.append(time.time())
+        last_posted_at = sent_at[-1]
+        last_rt_data_loaded = self.get_last_rt_loaded_time(coverage)
+
+        def covers_all_feeds(rt_data_loaded):
+            if rt_data_loaded == last_rt_data_loaded:
+                return False
+            return rt_reloaded_after(rt_data_loaded, last_posted_at) is not False
+
+        rt_data_loaded = waiting.wait_for(lambda: get_last_rt_data_loaded(coverage),
+                                          until=covers_all_feeds,
+                                          name='rt reload', label=coverage, timeout=60)
+        logger.info('RT data reloaded at {}'.format(rt_data_loaded))
+
+        # time between the post of each feed and the observation of the reload covering it
+        reloaded_at = time.time()
+        for rt_file_name, posted_at in zip(rt_file_names, sent_at):
+            timings.add('cots applied', reloaded_at - posted_at, label=rt_file_name)
@@ -3,10 +3,23 @@ py test discover this file by default
 
 Used to run some stuff at global scope
 """
+import inspect
 import logging
+import os
+import shutil
 import pytest
 from artemis import utils
 from artemis.configuration_manager import config
+from artemis.service_manager import services
+from artemis.common_fixture import CommonTestFixture
+from artemis.timing import timings
+from artemis.query_stats import query_stats
+from artemis.latency_baseline import latency_checker
+from artemis.tracing import tracer
+from artemis.load_test import query_corpus
+from artemis.reload_benchmark import reload_benchmark
+from artemis.benchmark import environment
+from artemis.containers import containers
 import requests
 
 
@@ -22,6 +35,199 @@ def pytest_addoption(parser):
     parser.addoption("--check_ref", action="store_true",
                      help="only check that response is consistent with full response in reference files")
     parser.addoption("--create_ref", action="store_true", help="create a reference file using the response received - USE WITH CAUTION")
+    parser.addoption("--restart_services", action="store_true",
+                     help="restart the krakens for each fixture, even if the next fixture uses the same data sets")
+    parser.addoption("--multi_scenario", action="store_true",
+                     help="run each test once, querying all the scenarios of its data set at the same time")
+    parser.addoption("--latency_repeat", action="store", type=int, default=1,
+                     help="repeat each query N times and compare its latencies with its baseline")
+    parser.addoption("--create_latency_baseline", action="store_true",
+                     help="create the latency baselines of the queries next to their references")
+    parser.addoption("--collect_queries", action="store", default=None,
+                     help="write the queries of the tests in this file for the load tests, "
+                          "without starting any service nor calling navitia")
+    parser.addoption("--trace_file", action="store", default=None,
+                     help="write a trace of the session in this file (Chrome trace format, for Perfetto)")
+    parser.addoption("--benchmark_reload", action="store", type=int, default=0,
+                     help="instead of running the tests, reload the data of each data set N times and time it")
+    parser.addoption("--reload_history", action="store", default='reload_history.json',
+                     help="file of the history of the data reload benchmarks")
+
+
+def pytest_sessionstart(session):
+    """
+    clean up the response dir before the tests
+
+    it is done for the test sessions only: the command line tools of the package (load_test, benchmark)
+    keep the responses and the measures of the last session
+    """
+    log = logging.getLogger(__name__)
+    log.info("removing output dir {}".format(config['RESPONSE_FILE_PATH']))
+    if os.path.exists(config['RESPONSE_FILE_PATH']):
+        shutil.rmtree(config['RESPONSE_FILE_PATH'])
+
+
+def pytest_configure(config):
+    latency_checker.configure(repeat=config.getvalue("latency_repeat"),
+                              create_baseline=config.getvalue("create_latency_baseline"))
+    if config.getvalue("trace_file"):
+        tracer.enable()
+    reload_benchmark.configure(repeat=config.getvalue("benchmark_reload"),
+                               history_path=config.getvalue("reload_history"))
+    if config.getvalue("collect_queries"):
+        query_corpus.start_collecting()
+        # the services are not needed, as when only the references are checked
+        config.option.check_ref = True
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    """
+    each test (with the setup and teardown of its fixtures) is a span of the trace
+    """
+    with tracer.span(item.nodeid, category='test'):
+        yield
+
+
+def _scenario_group(cls):
+    """
+    fixtures generated by set_scenario from the same tests on the same data set belong to the same group
+    """
+    data_sets = getattr(cls, 'data_sets', None)
+    if not data_sets or len(data_sets) != 1:
+        return None
+    tests = inspect.getmro(cls)[1]
+    if issubclass(tests, CommonTestFixture):
+        return None
+    return tests, data_sets[0].name
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, items):
+    """
+    In multi scenario mode, only the first fixture of each scenario group is run,
+    its tests query all the scenarios of the group
+    """
+    if not session.config.getvalue("multi_scenario"):
+        return
+    if config.get('USE_ARTEMIS_NG'):
+        logging.getLogger(__name__).warning("multi scenario mode is not available with Artemis NG, ignoring it")
+        return
+
+    groups = {}
+    for item in items:
+        cls = getattr(item, 'cls', None)
+        group = _scenario_group(cls)
+        if group is None:
+            continue
+        fixtures = groups.setdefault(group, [])
+        if cls not in fixtures:
+            fixtures.append(cls)
+
+    selected, deselected = [], []
+    for item in items:
+        fixtures = groups.get(_scenario_group(getattr(item, 'cls', None)))
+        if fixtures and item.cls is not fixtures[0]:
+            deselected.append(item)
+        else:
+            selected.append(item)
+
+    for fixtures in groups.values():
+        scenarios = []
+        for cls in fixtures:
+            if cls.data_sets[0].scenario not in scenarios:
+                scenarios.append(cls.data_sets[0].scenario)
+        if len(scenarios) > 1:
+            fixtures[0].multi_scenarios = scenarios
+
+    if deselected:
+        session.config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+def pytest_collection_finish(session):
+    """
+    Once the tests are collected, we know which fixtures will use which data sets
+    so the krakens can be kept running between the fixtures sharing a data set
+    """
+    if session.config.getvalue("restart_services"):
+        return
+
+    fixtures = []
+    for item in session.items:
+        cls = getattr(item, 'cls', None)
+        if cls is not None and hasattr(cls, 'data_sets') and cls not in fixtures:
+            fixtures.append(cls)
+
+    services.plan(cls.data_sets for cls in fixtures)
+
+
+def pytest_terminal_summary(terminalreporter):
+    """
+    Summarize the time spent by the harness (waits for reloads, databases cleaning, ...)
+    """
+    summary = timings.summary()
+    if summary:
+        terminalreporter.section("artemis timings")
+        for s in summary:
+            terminalreporter.write_line("{category:<30} count: {count:>5}  total: {total:>9.3f}s  "
+                                        "mean: {mean:>7.3f}s  max: {max:>7.3f}s".format(**s))
+
+    latencies = query_stats.summary()
+    if latencies:
+        terminalreporter.section("artemis query latencies")
+        for s in latencies:
+            terminalreporter.write_line("{data_set:<25} {scenario:<15} count: {count:>5}  p50: {p50:>8.1f}ms  "
+                                        "p95: {p95:>8.1f}ms  p99: {p99:>8.1f}ms  max: {max:>8.1f}ms".format(
+                                            **dict(s, **{k: s[k] * 1000 for k in ('p50', 'p95', 'p99', 'max')})))
+        terminalreporter.write_line("slowest queries:")
+        for r in query_stats.slowest():
+            terminalreporter.write_line("{:>8.1f}ms  {}  {}".format(r.latency * 1000, r.details.get('file'), r.url))
+
+    regressions = latency_checker.regressions()
+    if regressions:
+        terminalreporter.section("artemis latency regressions")
+        for r in regressions:
+            terminalreporter.write_line("{file}: {ratio:.2f}x the baseline ({low:.2f}x - {high:.2f}x), "
+                                        "median {median_ms:.1f}ms instead of {baseline_ms:.1f}ms".format(
+                                            median_ms=r['median'] * 1000, baseline_ms=r['baseline_median'] * 1000,
+                                            **r))
+
+    reloads = reload_benchmark.results()
+    if reloads:
+        terminalreporter.section("artemis data reloads")
+        for data_set, result in reloads.items():
+            for phase, s in result['summary'].items():
+                terminalreporter.write_line("{:<25} {:<30} median: {median:>9.3f}s  min: {min:>9.3f}s  "
+                                            "max: {max:>9.3f}s".format(data_set, phase, **s))
+        for c in reload_benchmark.comparison():
+            terminalreporter.write_line("{data_set:<25} {phase:<30} {ratio:.2f}x the previous benchmark "
+                                        "({median:.3f}s instead of {previous_median:.3f}s){}".format(
+                                            '  <- regression' if c['regression'] else '', **c))
+
+
+def pytest_sessionfinish(session):
+    """
+    Write the trace of the session, the history of the data reloads,
+    and the report of the latencies of the queries next to the responses
+    """
+    if config.get('USE_ARTEMIS_NG'):
+        containers.stop_following()
+
+    if session.config.getvalue("trace_file"):
+        tracer.write(session.config.getvalue("trace_file"))
+
+    if session.config.getvalue("collect_queries"):
+        query_corpus.write(session.config.getvalue("collect_queries"))
+
+    if reload_benchmark.results():
+        reload_benchmark.write_history(environment())
+
+    if not query_stats.records():
+        return
+    if not os.path.exists(config['RESPONSE_FILE_PATH']):
+        os.makedirs(config['RESPONSE_FILE_PATH'])
+    query_stats.write_report(os.path.join(config['RESPONSE_FILE_PATH'], 'query_latencies.json'))
 
 
 @pytest.fixture(scope="session", autouse=True)
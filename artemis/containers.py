@@ -0,0 +1,218 @@
+"""
+Docker containers of the navitia services (Artemis NG)
+
+The docker client and the containers are resolved only once for the whole session
+
+The logs of the containers and the docker events can be followed in background threads,
+to be notified as soon as something happens in a container (a kraken reload for example)
+"""
+import logging
+import re
+import threading
+import time
+
+import docker
+
+from artemis.configuration_manager import config
+
+logger = logging.getLogger(__name__)
+
+
+def exec_commands(container, commands):
+    """
+    run all the shell commands in one exec, stopping at the first failure
+
+    return the exit code and the output
+    """
+    result = container.exec_run(['sh', '-c', ' && '.join(commands)])
+    return result.exit_code, result.output
+
+
+class _Listener(object):
+    """
+    set its event each time a followed line matches its pattern, and remember when it happened
+    """
+    def __init__(self, pattern, event):
+        self._regex = re.compile(pattern)
+        self.event = event
+        self.matched_at = []
+
+    def notify(self, line):
+        if self._regex.search(line):
+            self.matched_at.append(time.time())
+            self.event.set()
+
+
+class _Follower(object):
+    """
+    follow a stream of lines in a background thread and notify the listeners of each line
+
+    the stream is opened when a listener is added and no thread is following it
+    (the logs stream of a container ends when the container is stopped),
+    and closed (ending the thread) when its last listener is removed
+    """
+    def __init__(self, name, open_stream, to_lines):
+        self._name = name
+        self._open_stream = open_stream
+        self._to_lines = to_lines
+        self._listeners = []
+        self._thread = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def listen(self, pattern, event=None):
+        listener = _Listener(pattern, event or threading.Event())
+        with self._lock:
+            self._listeners.append(listener)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._follow, name='follow {}'.format(self._name))
+                self._thread.daemon = True
+                self._thread.start()
+        return listener
+
+    def unlisten(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+            if not self._listeners:
+                self._close()
+
+    def stop(self):
+        with self._lock:
+            del self._listeners[:]
+            self._close()
+
+    def _close(self):
+        # called with the lock held, the following thread ends when its stream is closed
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception as e:
+                logger.debug("error while closing the stream of {}: {}".format(self._name, e))
+            self._stream = None
+
+    def _follow(self):
+        stream = None
+        try:
+            stream = self._open_stream()
+            with self._lock:
+                if not self._listeners:
+                    # nobody listens anymore
+                    stream.close()
+                    return
+                self._stream = stream
+            for line in self._to_lines(stream):
+                with self._lock:
+                    if self._stream is not stream:
+                        return
+                    listeners = list(self._listeners)
+                for listener in listeners:
+                    listener.notify(line)
+        except Exception as e:
+            with self._lock:
+                closed = stream is not None and self._stream is not stream
+            if not closed:
+                logger.warning("stopped following {}: {}".format(self._name, e))
+        finally:
+            with self._lock:
+                self._thread = None
+                if self._stream is stream:
+                    self._stream = None
+
+
+def _log_stream(container):
+    return container.logs(stream=True, follow=True, since=int(time.time()))
+
+
+def _log_lines(chunks):
+    """
+    >>> list(_log_lines([b'Loading database', b' from file: data.nav.lz4\\nstarting\\n', b'partial']))
+    ['Loading database from file: data.nav.lz4', 'starting']
+    """
+    buf = b''
+    for chunk in chunks:
+        lines = (buf + chunk).split(b'\n')
+        buf = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', 'replace')
+
+
+def _event_stream(client):
+    return client.events(decode=True, filters={'type': 'container'})
+
+
+def _event_lines(events):
+    for event in events:
+        name = event.get('Actor', {}).get('Attributes', {}).get('name', '')
+        yield '{} {}'.format(event.get('Action', event.get('status')), name)
+
+
+class ContainerRegistry(object):
+    def __init__(self):
+        self._client = None
+        self._all_containers = None
+        self._containers = {}
+        self._followers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                # the client is kept for the session, so the version is negotiated with the docker daemon
+                # only once with 'auto' (there is no negotiation at all with an explicit version)
+                self._client = docker.DockerClient(version=config['DOCKER_API_VERSION'])
+            return self._client
+
+    def get(self, name_part):
+        """
+        return the first running container with name_part in its name
+        """
+        client = self.client
+        with self._lock:
+            if name_part not in self._containers:
+                if self._all_containers is None:
+                    self._all_containers = client.containers.list()
+                    logger.debug("docker containers: {}".format([c.name for c in self._all_containers]))
+                found = [c for c in self._all_containers if name_part in c.name]
+                assert found, "No Docker Container found for {}".format(name_part)
+                self._containers[name_part] = found[0]
+            return self._containers[name_part]
+
+    def _follower(self, key, open_stream, to_lines):
+        with self._lock:
+            if key not in self._followers:
+                self._followers[key] = _Follower(key, open_stream, to_lines)
+            return self._followers[key]
+
+    def logs(self, name_part):
+        """
+        follower of the logs of the container
+        """
+        container = self.get(name_part)
+        return self._follower('logs of {}'.format(container.name), lambda: _log_stream(container), _log_lines)
+
+    def events(self):
+        """
+        follower of the docker events of the containers, as lines '<action> <container name>'
+        """
+        client = self.client
+        return self._follower('docker events', lambda: _event_stream(client), _event_lines)
+
+    def stop_following(self):
+        """
+        stop following the logs and the events of the containers (at the end of the session)
+        """
+        with self._lock:
+            followers = list(self._followers.values())
+        for follower in followers:
+            follower.stop()
+
+    def tyr_worker(self):
+        return self.get('tyr_worker')
+
+    def kraken(self, data_set_name):
+        return self.get(data_set_name)
+
+
+containers = ContainerRegistry()
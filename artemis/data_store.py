@@ -0,0 +1,136 @@
+"""
+Incremental upload of the data sets to the tyr_worker container (Artemis NG)
+
+The files are stored once in a cache directory of the container, named by the digest of their content,
+and linked in the input directory of the data set when needed.
+The uploads are done by a pool shared by all the data sets, and a file needed by several data sets
+at the same time (the osm file for example) is uploaded only once.
+A manifest of the digests of the data loaded for each data set is kept next to its .nav.lz4,
+so only the data that changed since the last binarization are sent.
+"""
+import io
+import json
+import logging
+import tarfile
+import threading
+from multiprocessing.pool import ThreadPool
+
+import docker
+from six.moves import shlex_quote
+
+from artemis import archive
+from artemis.containers import exec_commands
+
+logger = logging.getLogger(__name__)
+
+
+class ContainerDataStore(object):
+    def __init__(self, container, cache_path, output_path, max_workers=4):
+        self._container = container
+        self._cache_path = cache_path
+        self._output_path = output_path
+        # digests of the files in the cache directory, read only once
+        self._cached_digests = None
+        # uploads started (in progress or done) by digest, as AsyncResult of the upload pool
+        self._uploads = {}
+        self._upload_pool = ThreadPool(max_workers)
+        self._lock = threading.Lock()
+
+    def _manifest_path(self, data_set_name):
+        return '{}/{}.artemis_manifest.json'.format(self._output_path, data_set_name)
+
+    def nav_exists(self, data_set_name):
+        exit_code, _ = exec_commands(self._container, ['test -f {}'.format(
+            shlex_quote('{}/{}.nav.lz4'.format(self._output_path, data_set_name)))])
+        return exit_code == 0
+
+    def read_manifest(self, data_set_name):
+        """
+        return the digest of each file of the last data loaded for the data set
+        """
+        try:
+            chunks, _ = self._container.get_archive(self._manifest_path(data_set_name))
+        except docker.errors.NotFound:
+            return {}
+
+        tar = tarfile.open(fileobj=io.BytesIO(b''.join(chunks)))
+        member = tar.getmembers()[0]
+        return json.loads(tar.extractfile(member).read().decode('utf-8'))
+
+    def write_manifest(self, data_set_name, members):
+        manifest = {m.arcname: m.digest for m in members}
+        data = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+        member = archive.BytesMember(data, arcname=self._manifest_path(data_set_name).split('/')[-1])
+        self._container.put_archive(self._output_path, archive.tar_stream([member]))
+
+    def _get_cached_digests(self):
+        with self._lock:
+            if self._cached_digests is None:
+                _, output = exec_commands(self._container, ['mkdir -p {}'.format(shlex_quote(self._cache_path)),
+                                                            'ls {}'.format(shlex_quote(self._cache_path))])
+                self._cached_digests = set(output.decode('utf-8').split())
+            return set(self._cached_digests)
+
+    def _send(self, member):
+        logger.info('sending {} to the container'.format(member.arcname))
+        try:
+            self._container.put_archive(self._cache_path, archive.tar_stream([_Renamed(member, member.digest)]))
+        except:
+            # the next put needing the file will send it again
+            with self._lock:
+                self._uploads.pop(member.digest, None)
+            raise
+        with self._lock:
+            self._cached_digests.add(member.digest)
+
+    def _upload(self, members, force=False):
+        """
+        send the files not in the cache yet (all the files with force) and wait for their uploads
+
+        a file being uploaded for another put is not sent again, its upload is waited for
+        """
+        cached_digests = self._get_cached_digests()
+        uploads = {}
+        with self._lock:
+            for m in members:
+                if m.digest in uploads:
+                    continue
+                upload = self._uploads.get(m.digest)
+                if upload is not None and not (force and upload.ready()):
+                    uploads[m.digest] = upload
+                elif force or m.digest not in cached_digests:
+                    uploads[m.digest] = self._uploads[m.digest] = self._upload_pool.apply_async(self._send, (m,))
+        for upload in uploads.values():
+            upload.get()
+
+    def put(self, members, input_path, before=(), force=False):
+        """
+        put the files in the input directory, only the files not already in the cache are sent
+
+        each file is sent in its own archive, by the upload pool of the store
+
+        :param before: shell commands to run (in the same exec) before putting the files in the input directory
+        :param force: send all the files, even the ones already in the cache (to measure the whole upload)
+        """
+        self._upload(members, force=force)
+
+        # a hard link is enough if the cache and the input directory are on the same file system
+        commands = list(before) + ['mkdir -p {}'.format(shlex_quote(input_path))]
+        for m in members:
+            src = shlex_quote('{}/{}'.format(self._cache_path, m.digest))
+            dst = shlex_quote('{}/{}'.format(input_path, m.arcname))
+            commands.append('(ln -f {src} {dst} 2>/dev/null || cp {src} {dst})'.format(src=src, dst=dst))
+        exit_code, output = exec_commands(self._container, commands)
+        assert exit_code == 0, "impossible to put the data in {}: {}".format(input_path, output)
+
+
+class _Renamed(object):
+    """
+    a member of an archive under another name
+    """
+    def __init__(self, member, arcname):
+        self._member = member
+        self.arcname = arcname
+
+    def __getattr__(self, item):
+        return getattr(self._member, item)
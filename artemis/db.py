@@ -0,0 +1,176 @@
+"""
+Access to the postgres databases used by the harness (jormungandr and kirin)
+
+The connections to each database are pooled and kept for the whole session
+"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from artemis.timing import timings
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection(psycopg2.extensions.connection):
+    """
+    connection remembering the statements prepared on it
+    """
+    def __init__(self, *args, **kwargs):
+        super(_Connection, self).__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class Database(object):
+    def __init__(self, connection_string, max_connections=4):
+        self._connection_string = connection_string
+        self._max_connections = max_connections
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                logger.debug("connecting to {}".format(self._connection_string))
+                self._pool = ThreadedConnectionPool(1, self._max_connections, self._connection_string,
+                                                    connection_factory=_Connection)
+            return self._pool
+
+    @contextmanager
+    def cursor(self):
+        """
+        give a cursor in a transaction, committed at the end of the with block (or rollbacked on error)
+
+        the connection is taken from the pool, and discarded if an error occurs
+        """
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                yield cur
+            conn.commit()
+        except:
+            pool.putconn(conn, close=True)
+            raise
+        pool.putconn(conn, close=conn.closed)
+
+
+def execute_prepared(cur, name, query, params=()):
+    """
+    execute a query, prepared only the first time it is used on the cursor's connection
+
+    the parameters are referenced by $1, $2, ... in the query
+    """
+    conn = cur.connection
+    if name not in conn.prepared_statements:
+        cur.execute("PREPARE {} AS {}".format(name, query))
+        conn.prepared_statements.add(name)
+
+    if params:
+        cur.execute("EXECUTE {} ({})".format(name, ', '.join(['%s'] * len(params))), params)
+    else:
+        cur.execute("EXECUTE {}".format(name))
+
+
+def insert_many(cur, table, columns, rows):
+    """
+    insert all the rows in one query
+    """
+    execute_values(cur, "INSERT INTO {} ({}) VALUES %s".format(table, ', '.join(columns)), rows)
+
+
+def sort_tables(tables, dependencies):
+    """
+    sort the tables so that a table comes after all the tables referencing it
+
+    :param dependencies: list of (table, referenced table)
+    raise a ValueError if the foreign keys make a cycle (no such order exists)
+
+    >>> sort_tables(['vehicle_journey', 'trip_update', 'stop_time_update'],
+    ...             [('trip_update', 'vehicle_journey'), ('stop_time_update', 'trip_update')])
+    ['stop_time_update', 'trip_update', 'vehicle_journey']
+    >>> sort_tables(['a', 'b'], [('a', 'b'), ('b', 'a')])
+    Traceback (most recent call last):
+    ...
+    ValueError: foreign keys cycle between the tables: a, b
+    """
+    referencing = defaultdict(set)
+    for table, referenced in dependencies:
+        if table != referenced:
+            referencing[referenced].add(table)
+
+    res = []
+
+    def visit(table, path):
+        if table in path:
+            raise ValueError("foreign keys cycle between the tables: {}".format(', '.join(sorted(path))))
+        if table in res:
+            return
+        for t in sorted(referencing[table]):
+            visit(t, path | {table})
+        res.append(table)
+
+    for table in tables:
+        visit(table, set())
+
+    return [t for t in res if t in tables]
+
+
+class DatabaseCleaner(object):
+    """
+    Empty all the tables of a database
+
+    The tables and the query are computed only once for the session
+
+    2 methods are available:
+    * 'truncate' (the default): one TRUNCATE of all the tables
+    * 'delete': DELETE all the tables, in the foreign keys order, in one transaction, with prepared statements.
+      It can be faster than TRUNCATE when the tables contains only a few rows.
+      If the foreign keys make a cycle, there is no such order and the tables are truncated instead
+    """
+    def __init__(self, database, excluded_tables=(), method='truncate', name='db'):
+        assert method in ('truncate', 'delete'), "unknown cleaning method {}".format(method)
+        self._db = database
+        self._excluded_tables = excluded_tables
+        self._method = method
+        self._name = name
+        self._queries = None
+
+    def _tables(self, cur):
+        cur.execute("SELECT relname FROM pg_stat_user_tables;")
+        return sorted(r[0] for r in cur.fetchall() if r[0] not in self._excluded_tables)
+
+    def _compute_queries(self, cur):
+        tables = self._tables(cur)
+        logger.debug("tables to clean in {}: {}".format(self._name, tables))
+
+        # TRUNCATE cannot be prepared
+        truncate = [(None, "TRUNCATE {} CASCADE".format(', '.join(tables)))]
+        if self._method == 'truncate':
+            return truncate
+
+        cur.execute("SELECT c.conrelid::regclass::text, c.confrelid::regclass::text "
+                    "FROM pg_constraint c WHERE c.contype = 'f';")
+        try:
+            sorted_tables = sort_tables(tables, cur.fetchall())
+        except ValueError as e:
+            logger.warning("impossible to clean {} with DELETE ({}), truncating it".format(self._name, e))
+            return truncate
+        return [("artemis_clean_{}".format(t), "DELETE FROM {}".format(t)) for t in sorted_tables]
+
+    def clean(self):
+        with timings.timed('{} cleaning'.format(self._name)):
+            with self._db.cursor() as cur:
+                if self._queries is None:
+                    self._queries = self._compute_queries(cur)
+                for name, query in self._queries:
+                    if name:
+                        execute_prepared(cur, name, query)
+                    else:
+                        cur.execute(query)
@@ -15,6 +15,8 @@ URL_TYR = os.getenv('ARTEMIS_URL_TYR', 'http://localhost:9898')
 # Usefull when using Kirin with Artemis
 KIRIN_API = os.getenv('ARTEMIS_KIRIN_API', 'http://localhost:9090')
 KIRIN_DB = os.getenv('ARTEMIS_KIRIN_DB', 'dbname=kirin user=kirin host=localhost password=kirin')
+# 'truncate' or 'delete' (can be faster with the few rows of the tests, falls back to truncate on foreign keys cycles)
+KIRIN_DB_CLEANING_METHOD = os.getenv('ARTEMIS_KIRIN_DB_CLEANING_METHOD', 'truncate')
 
 # Path of the Artemis references
 REFERENCE_FILE_PATH = os.getenv('ARTEMIS_REFERENCE_FILE_PATH', 'reference')
@@ -38,10 +40,38 @@ JORMUNGANDR_DB = 'dbname=jormungandr user=jormungandr host=localhost password=jo
 
 CITIES_DB = 'dbname=cities user=navitia host=localhost password=password'
 
+# version of the docker API ('auto' to negotiate it with the daemon, once for the session)
+DOCKER_API_VERSION = os.getenv('ARTEMIS_DOCKER_API_VERSION', 'auto')
+
 CONTAINER_DATA_INPUT_PATH = '/srv/ed/input'
 
 CONTAINER_DATA_OUTPUT_PATH = '/srv/ed/output'
 
+# the data files sent to the container are stored there once (named by the digest of their content)
+CONTAINER_DATA_CACHE_PATH = '/srv/ed/artemis_cache'
+
+# lines of the logs of the kraken containers at the beginning and at the end of a data load
+# (they wake up the polling of the coverage status, and the beginning splits the binarization and the kraken load).
+# A warning is logged if one of them never matches during a reload
+KRAKEN_LOAD_START_LOG = os.getenv('ARTEMIS_KRAKEN_LOAD_START_LOG', r'Loading database from file')
+KRAKEN_LOAD_END_LOG = os.getenv('ARTEMIS_KRAKEN_LOAD_END_LOG', r'(?i)\bdata loaded\b')
+
+# number of data files and data sets sent at the same time to the tyr_worker container
+DATA_PUSH_WORKERS = int(os.getenv('ARTEMIS_DATA_PUSH_WORKERS', 4))
+
+# number of threads of the pool shared by all the concurrent steps of the harness (krakens start, data push, ...)
+THREAD_POOL_SIZE = int(os.getenv('ARTEMIS_THREAD_POOL_SIZE', 16))
+
+# a query latency regressed if its median is, with this confidence, above its baseline by more than the threshold
+LATENCY_REGRESSION_THRESHOLD = float(os.getenv('ARTEMIS_LATENCY_REGRESSION_THRESHOLD', 0.2))
+LATENCY_REGRESSION_CONFIDENCE = float(os.getenv('ARTEMIS_LATENCY_REGRESSION_CONFIDENCE', 0.95))
+
+# what to do when a query takes longer than its latency budget: 'fail' the test or only 'warn'
+LATENCY_BUDGET_MODE = os.getenv('ARTEMIS_LATENCY_BUDGET_MODE', 'fail')
+
+# a data reload regressed if its median duration is above the one of the previous benchmark by more than the threshold
+RELOAD_REGRESSION_THRESHOLD = float(os.getenv('ARTEMIS_RELOAD_REGRESSION_THRESHOLD', 0.2))
+
 LOGGER = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -0,0 +1,93 @@
+"""
+Latency histogram with a bounded relative error (in the spirit of HdrHistogram)
+
+The values are counted in log-linear buckets: each power of 2 is split in linear sub-buckets,
+so any value is known with a relative precision given by the number of significant digits,
+whatever its magnitude, with a small and constant memory.
+"""
+import math
+from collections import Counter, OrderedDict
+
+
+class LatencyHistogram(object):
+    """
+    histogram of durations in seconds, recorded with a microsecond resolution
+
+    >>> h = LatencyHistogram()
+    >>> for ms in range(1, 101):
+    ...     h.record(ms / 1000.)
+    >>> h.count, int(round(h.value_at_percentile(50) * 1000)), int(round(h.value_at_percentile(99) * 1000))
+    (100, 50, 99)
+    >>> h.record(10.)
+    >>> abs(h.max - 10.) / 10. < 0.01
+    True
+    """
+    def __init__(self, significant_digits=2):
+        # number of linear sub-buckets in each power of 2, enough for the precision asked
+        self._sub_buckets = 2 ** int(math.ceil(math.log(2 * 10 ** significant_digits, 2)))
+        self._counts = Counter()
+        self.count = 0
+        self._total = 0.
+        self.min = None
+        self.max = None
+
+    def _index(self, micros):
+        magnitude = int(math.floor(math.log(micros, 2)))
+        sub = int((float(micros) / 2 ** magnitude - 1) * self._sub_buckets)
+        return magnitude, sub
+
+    def _value(self, index):
+        """
+        middle of the bucket, in seconds
+        """
+        magnitude, sub = index
+        low = 2 ** magnitude * (1 + float(sub) / self._sub_buckets)
+        high = 2 ** magnitude * (1 + float(sub + 1) / self._sub_buckets)
+        return (low + high) / 2 / 1e6
+
+    def record(self, seconds, count=1):
+        micros = max(int(round(seconds * 1e6)), 1)
+        self._counts[self._index(micros)] += count
+        self.count += count
+        self._total += seconds * count
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other):
+        self._counts.update(other._counts)
+        self.count += other.count
+        self._total += other._total
+        for v in (other.min, other.max):
+            if v is not None:
+                self.min = v if self.min is None else min(self.min, v)
+                self.max = v if self.max is None else max(self.max, v)
+
+    @property
+    def mean(self):
+        return self._total / self.count if self.count else None
+
+    def value_at_percentile(self, p):
+        """
+        value (in seconds) below which p percent of the recorded values are
+        """
+        if not self.count:
+            return None
+        target = max(int(math.ceil(self.count * p / 100.)), 1)
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= target:
+                # the bucket value is bounded by the real extremes
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def percentiles(self, ps=(50, 90, 99, 99.9)):
+        """
+        the percentiles and the max, in milliseconds
+        """
+        res = OrderedDict()
+        for p in ps:
+            value = self.value_at_percentile(p)
+            res['p{}_ms'.format(p)] = value * 1000 if value is not None else None
+        res['max_ms'] = self.max * 1000 if self.max is not None else None
+        return res
@@ -0,0 +1,174 @@
+"""
+Latency baselines of the queries, stored next to their references
+
+A baseline keeps several latency samples of a query and their summary statistics.
+When a query is repeated, its samples are compared with its baseline by bootstrapping the ratio
+of their medians: the latency regressed if, with the given confidence, the query is slower
+than its baseline by more than the threshold.
+
+numpy is only needed when the baselines are used
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from artemis.configuration_manager import config
+
+logger = logging.getLogger(__name__)
+
+
+def baseline_path(filename):
+    """
+    path of the latency baseline of the query whose reference is 'filename'
+
+    >>> baseline_path('TestIdfm/distributed/test_journey.json').endswith('TestIdfm/distributed/test_journey.latency.json')
+    True
+    """
+    if filename.endswith('.json'):
+        filename = filename[:-len('.json')]
+    return os.path.join(config['REFERENCE_FILE_PATH'], filename + '.latency.json')
+
+
+def summarize(samples):
+    """
+    summary statistics of latency samples (in seconds)
+
+    >>> s = summarize([0.1, 0.2, 0.3, 0.4])
+    >>> s['count'], round(s['median'], 3), round(s['p95'], 3)
+    (4, 0.25, 0.385)
+    """
+    import numpy as np
+
+    values = np.asarray(samples, dtype=float)
+    return OrderedDict([('count', int(values.size)),
+                        ('mean', float(values.mean())),
+                        ('median', float(np.median(values))),
+                        ('p95', float(np.percentile(values, 95))),
+                        ('std', float(values.std())),
+                        ('min', float(values.min())),
+                        ('max', float(values.max()))])
+
+
+def bootstrap_median_ratio(samples, baseline_samples, resamples=2000, confidence=0.95, seed=0):
+    """
+    ratio of the medians of the samples and of the baseline samples, with its bootstrap confidence interval
+
+    return (ratio, low, high)
+
+    >>> ratio, low, high = bootstrap_median_ratio([0.2, 0.21, 0.19, 0.2, 0.22], [0.1, 0.11, 0.09, 0.1, 0.1])
+    >>> round(ratio, 1), low > 1.5
+    (2.0, True)
+    """
+    import numpy as np
+
+    samples = np.asarray(samples, dtype=float)
+    baseline_samples = np.asarray(baseline_samples, dtype=float)
+    rng = np.random.RandomState(seed)
+
+    medians = np.median(rng.choice(samples, (resamples, samples.size)), axis=1)
+    baseline_medians = np.median(rng.choice(baseline_samples, (resamples, baseline_samples.size)), axis=1)
+    ratios = medians / baseline_medians
+
+    alpha = (1 - confidence) / 2 * 100
+    return (float(np.median(samples) / np.median(baseline_samples)),
+            float(np.percentile(ratios, alpha)),
+            float(np.percentile(ratios, 100 - alpha)))
+
+
+def read_baseline(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_baseline(path, url, samples):
+    baseline = OrderedDict([('query', url),
+                            ('samples', list(samples)),
+                            ('summary', summarize(samples))])
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(json.dumps(baseline, indent=2))
+    logger.info("latency baseline written in {}".format(path))
+
+
+class LatencyChecker(object):
+    """
+    repeat the queries, and create or check their latency baselines
+
+    configured once for the session with the pytest options
+    """
+    def __init__(self):
+        self.repeat = 1
+        self.create_baseline = False
+        self._regressions = []
+        self._lock = threading.Lock()
+
+    def configure(self, repeat=1, create_baseline=False):
+        self.repeat = max(repeat or 1, 1)
+        self.create_baseline = create_baseline
+
+    @property
+    def active(self):
+        return self.repeat > 1 or self.create_baseline
+
+    def samples(self, record):
+        """
+        the latency of the recorded query, and of its repetitions
+        """
+        samples = [record.latency]
+        for _ in range(self.repeat - 1):
+            begin = time.time()
+            requests.get(record.url)
+            samples.append(time.time() - begin)
+        return samples
+
+    def check(self, filename, record):
+        """
+        repeat the query and compare its latency with its baseline (or create the baseline)
+
+        the result is added to the details of the record
+        """
+        if not self.active:
+            return
+
+        samples = self.samples(record)
+        record.details['latency_samples'] = samples
+        path = baseline_path(filename)
+
+        if self.create_baseline:
+            write_baseline(path, record.url, samples)
+            return
+
+        baseline = read_baseline(path)
+        if baseline is None:
+            logger.warning("no latency baseline for {}".format(filename))
+            return
+
+        ratio, low, high = bootstrap_median_ratio(samples, baseline['samples'],
+                                                  confidence=config['LATENCY_REGRESSION_CONFIDENCE'])
+        record.details['latency_ratio'] = [ratio, low, high]
+        if low > 1 + config['LATENCY_REGRESSION_THRESHOLD']:
+            logger.warning("latency regression for {}: {:.2f}x the baseline ({:.2f}x - {:.2f}x)".format(
+                filename, ratio, low, high))
+            with self._lock:
+                self._regressions.append(OrderedDict([('file', filename),
+                                                      ('url', record.url),
+                                                      ('ratio', ratio),
+                                                      ('low', low),
+                                                      ('high', high),
+                                                      ('median', summarize(samples)['median']),
+                                                      ('baseline_median', baseline['summary']['median'])]))
+
+    def regressions(self):
+        with self._lock:
+            return list(self._regressions)
+
+
+latency_checker = LatencyChecker()
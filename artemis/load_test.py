@@ -0,0 +1,386 @@
+"""
+Load test of navitia with the queries of the tests
+
+The queries built by the tests (with journey() and api()) are first collected in a corpus file,
+without starting any service nor comparing any response:
+
+    py.test artemis/tests --collect_queries queries.jsonl
+
+The corpus is then replayed against URL_JORMUN, by a given number of concurrent workers
+and optionally at a target rate, reporting the throughput, the latency percentiles and the error rate:
+
+    python -m artemis.load_test queries.jsonl --concurrency 8 --duration 60 [--qps 50] [--data_set idfm]
+
+Those workers wait for their response before sending their next query (closed loop): when navitia stalls,
+less queries are sent and the tail latency is under-reported.
+With --rate, the queries are sent on a fixed schedule whatever the responses time (open loop),
+and the latency of each query is measured from the time it should have been sent:
+
+    python -m artemis.load_test queries.jsonl --rate 50 --arrival poisson --duration 60
+"""
+import argparse
+import itertools
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from six.moves import queue
+
+import requests
+import werkzeug
+
+from artemis.configuration_manager import config
+from artemis.histogram import LatencyHistogram
+from artemis.query_stats import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCorpus(object):
+    """
+    the queries collected while running the tests
+    """
+    def __init__(self):
+        self.collecting = False
+        self._queries = []
+        self._lock = threading.Lock()
+
+    def start_collecting(self):
+        self.collecting = True
+
+    def add(self, url, data_set, scenario, filename):
+        with self._lock:
+            self._queries.append(OrderedDict([('url', url),
+                                              ('data_set', data_set),
+                                              ('scenario', scenario),
+                                              ('file', filename)]))
+
+    def queries(self):
+        with self._lock:
+            return list(self._queries)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for query in self.queries():
+                f.write(json.dumps(query) + '\n')
+        logger.info("{} queries collected in {}".format(len(self._queries), path))
+
+
+query_corpus = QueryCorpus()
+
+
+def read_corpus(path, data_sets=None, scenarios=None):
+    """
+    read the queries of a corpus file, only the ones on the given data sets and scenarios if provided
+    """
+    with open(path) as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    return [q for q in queries
+            if (not data_sets or q['data_set'] in data_sets) and (not scenarios or q['scenario'] in scenarios)]
+
+
+def query_url(query, root=None, override_scenario=False):
+    """
+    full url of a query of the corpus (normalized as in utils.request)
+
+    with override_scenario, the query is forced on its scenario with _override_scenario
+    """
+    url = query['url']
+    if override_scenario:
+        url = '{}{}_override_scenario={}'.format(url, '&' if '?' in url else '?', query['scenario'])
+    return werkzeug.url_fix((root or config['URL_JORMUN'] + '/v1/') + url)
+
+
+class Sample(object):
+    """
+    a call made during a load test, the times are timestamps
+    """
+    __slots__ = ('url', 'sent_at', 'latency', 'status_code', 'error')
+
+    def __init__(self, url, sent_at, latency, status_code=None, error=None):
+        self.url = url
+        self.sent_at = sent_at
+        self.latency = latency
+        self.status_code = status_code
+        self.error = error
+
+    @property
+    def failed(self):
+        return self.error is not None or self.status_code >= 400
+
+
+def call(session, url):
+    """
+    call the url and return a Sample
+    """
+    sent_at = time.time()
+    try:
+        response = session.get(url)
+        # the response is entirely read, as a client would do
+        response.content
+        return Sample(url, sent_at, time.time() - sent_at, status_code=response.status_code)
+    except requests.RequestException as e:
+        return Sample(url, sent_at, time.time() - sent_at, error=str(e))
+
+
+class _Pacer(object):
+    """
+    give the send times of the workers to reach a target rate (None for no limit)
+    """
+    def __init__(self, qps):
+        self._interval = 1. / qps if qps else 0
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            send_at = max(self._next, time.time())
+            self._next = send_at + self._interval
+        delay = send_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_closed_loop(urls, concurrency=1, duration=None, count=None, qps=None):
+    """
+    replay the urls (in a loop) with 'concurrency' workers, each one waiting for its response before its next call
+
+    the load stops after 'duration' seconds or 'count' calls (one pass on the urls by default)
+    return the samples and the duration of the load
+    """
+    if duration is None and count is None:
+        count = len(urls)
+
+    next_url = itertools.cycle(urls)
+    calls = itertools.count()
+    pacer = _Pacer(qps)
+    samples = []
+    lock = threading.Lock()
+    begin = time.time()
+    deadline = begin + duration if duration else None
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if (count is not None and next(calls) >= count) or (deadline and time.time() >= deadline):
+                    return
+                url = next(next_url)
+            pacer.wait()
+            sample = call(session, url)
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=worker, name='load worker {}'.format(i)) for i in range(concurrency)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+
+    return samples, time.time() - begin
+
+
+def arrival_offsets(rate, duration, arrival='constant', seed=None):
+    """
+    times (from the beginning of the load) at which the queries are to be sent
+
+    >>> list(arrival_offsets(rate=4, duration=1))
+    [0.0, 0.25, 0.5, 0.75]
+    >>> offsets = list(arrival_offsets(rate=100, duration=10, arrival='poisson', seed=1))
+    >>> 900 < len(offsets) < 1100
+    True
+    """
+    assert arrival in ('constant', 'poisson'), "unknown arrival {}".format(arrival)
+    rng = random.Random(seed)
+    offset = 0.
+    while offset < duration:
+        yield offset
+        offset += rng.expovariate(rate) if arrival == 'poisson' else 1. / rate
+
+
+def run_open_loop(urls, rate, duration, arrival='constant', max_in_flight=256, seed=None):
+    """
+    send the urls (in a loop) on a fixed schedule, at 'rate' queries per second during 'duration' seconds
+
+    the queries are sent by a pool of 'max_in_flight' workers. If they are all busy, the query waits for one,
+    but its latency still counts from the time it was scheduled (no coordinated omission)
+    return a dict with the histograms of the latencies (from the scheduled time) and of the service times
+    (from the real send time), the samples, and the duration of the schedule
+    """
+    to_send = queue.Queue()
+    latencies, service_times = LatencyHistogram(), LatencyHistogram()
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            item = to_send.get()
+            if item is None:
+                return
+            scheduled_at, url = item
+            sample = call(session, url)
+            with lock:
+                samples.append(sample)
+                latencies.record(sample.sent_at + sample.latency - scheduled_at)
+                service_times.record(sample.latency)
+
+    workers = [threading.Thread(target=worker, name='load worker {}'.format(i)) for i in range(max_in_flight)]
+    for t in workers:
+        t.daemon = True
+        t.start()
+
+    next_url = itertools.cycle(urls)
+    begin = time.time()
+    scheduled = 0
+    for offset in arrival_offsets(rate, duration, arrival, seed):
+        delay = begin + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        to_send.put((begin + offset, next(next_url)))
+        scheduled += 1
+    schedule_duration = time.time() - begin
+
+    for _ in workers:
+        to_send.put(None)
+    for t in workers:
+        t.join()
+
+    return {'latencies': latencies,
+            'service_times': service_times,
+            'samples': samples,
+            'scheduled': scheduled,
+            'duration': schedule_duration,
+            'elapsed': time.time() - begin}
+
+
+def summarize_open_loop(result, rate):
+    """
+    achieved rate (from the real send times) versus target rate, and the percentiles of the histograms
+    """
+    sent_at = sorted(s.sent_at for s in result['samples'])
+    send_span = sent_at[-1] - sent_at[0] if len(sent_at) > 1 else 0
+    res = OrderedDict()
+    res['target_rate'] = rate
+    # n queries sent over the span between the first and last send: n - 1 intervals
+    res['achieved_rate'] = (len(sent_at) - 1) / send_span if send_span else None
+    res['scheduled'] = result['scheduled']
+    res['completed'] = len(result['samples'])
+    res['duration'] = result['elapsed']
+    res['error_rate'] = (float(sum(1 for s in result['samples'] if s.failed)) / len(result['samples'])
+                         if result['samples'] else None)
+    res['latency'] = result['latencies'].percentiles()
+    res['service_time'] = result['service_times'].percentiles()
+    return res
+
+
+def print_open_loop_summary(summary, out=sys.stdout):
+    def percentiles(values):
+        return '  '.join('{} {:.1f}ms'.format(k[:-3], v) for k, v in values.items() if v is not None)
+
+    lines = ["calls:         {completed} completed / {scheduled} scheduled in {duration:.1f}s".format(**summary),
+             "rate:          {:.1f} req/s achieved, {:.1f} req/s targeted".format(summary['achieved_rate'] or 0,
+                                                                               summary['target_rate']),
+             "error rate:    {:.2%}".format(summary['error_rate'] or 0),
+             "latency:       {}".format(percentiles(summary['latency'])),
+             "service time:  {}".format(percentiles(summary['service_time']))]
+    for line in lines:
+        out.write(line + '\n')
+
+
+def summarize(samples, elapsed):
+    """
+    throughput, latency percentiles (in ms) and error rate of a load
+
+    >>> s = summarize([Sample('u', 0, 0.1, 200), Sample('u', 0, 0.3, 200), Sample('u', 0, 0.2, 500)], elapsed=2.)
+    >>> s['count'], s['throughput'], s['error_rate'], round(s['p50_ms'], 1)
+    (3, 1.5, 0.3333333333333333, 200.0)
+    """
+    latencies = [s.latency for s in samples]
+    statuses = Counter(s.error and 'error' or str(s.status_code) for s in samples)
+    res = OrderedDict()
+    res['count'] = len(samples)
+    res['duration'] = elapsed
+    res['throughput'] = len(samples) / elapsed if elapsed else None
+    res['error_rate'] = float(sum(1 for s in samples if s.failed)) / len(samples) if samples else None
+    for p in (50, 90, 95, 99):
+        value = percentile(latencies, p)
+        res['p{}_ms'.format(p)] = value * 1000 if value is not None else None
+    res['max_ms'] = max(latencies) * 1000 if latencies else None
+    res['statuses'] = OrderedDict(sorted(statuses.items()))
+    return res
+
+
+def print_summary(summary, out=sys.stdout):
+    lines = ["calls:       {count} in {duration:.1f}s".format(**summary),
+             "throughput:  {:.1f} req/s".format(summary['throughput'] or 0),
+             "error rate:  {:.2%}".format(summary['error_rate'] or 0),
+             "latency:     p50 {p50_ms:.1f}ms  p90 {p90_ms:.1f}ms  p95 {p95_ms:.1f}ms  "
+             "p99 {p99_ms:.1f}ms  max {max_ms:.1f}ms".format(**summary) if summary['count'] else "latency:     -",
+             "statuses:    {}".format(', '.join('{}: {}'.format(k, v) for k, v in summary['statuses'].items()))]
+    for line in lines:
+        out.write(line + '\n')
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument('corpus', help="file of the queries collected with py.test --collect_queries")
+    parser.add_argument('--data_set', action='append', help="only the queries on this data set (can be repeated)")
+    parser.add_argument('--scenario', action='append', help="only the queries of this scenario (can be repeated)")
+    parser.add_argument('--override_scenario', action='store_true',
+                        help="force the scenario of each query with _override_scenario")
+    parser.add_argument('--url', default=None, help="root of the api (by default URL_JORMUN/v1/)")
+
+
+def corpus_urls(args):
+    queries = read_corpus(args.corpus, data_sets=args.data_set, scenarios=args.scenario)
+    assert queries, "no query to replay in {}".format(args.corpus)
+    return [query_url(q, root=args.url, override_scenario=args.override_scenario) for q in queries]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="replay the queries of the tests against navitia")
+    add_corpus_arguments(parser)
+    parser.add_argument('--concurrency', type=int, default=1, help="number of concurrent workers")
+    parser.add_argument('--qps', type=float, default=None,
+                        help="target rate of the workers (queries per second)")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="open loop: send the queries on a fixed schedule at this rate (queries per second)")
+    parser.add_argument('--arrival', choices=['constant', 'poisson'], default='constant',
+                        help="open loop: intervals between the queries")
+    parser.add_argument('--max_in_flight', type=int, default=256,
+                        help="open loop: maximum number of queries waiting for their response")
+    parser.add_argument('--duration', type=float, default=None, help="duration of the load in seconds")
+    parser.add_argument('--count', type=int, default=None,
+                        help="number of calls (by default, each query is called once)")
+    parser.add_argument('--output', default=None, help="write the summary in this json file")
+    args = parser.parse_args(argv)
+
+    urls = corpus_urls(args)
+    if args.rate:
+        assert args.duration, "the duration of an open loop load is needed"
+        logger.info("sending {} queries at {} req/s ({})".format(len(urls), args.rate, args.arrival))
+        result = run_open_loop(urls, rate=args.rate, duration=args.duration, arrival=args.arrival,
+                               max_in_flight=args.max_in_flight)
+        summary = summarize_open_loop(result, args.rate)
+        print_open_loop_summary(summary)
+    else:
+        logger.info("replaying {} queries with {} workers".format(len(urls), args.concurrency))
+        samples, elapsed = run_closed_loop(urls, concurrency=args.concurrency, duration=args.duration,
+                                           count=args.count, qps=args.qps)
+        summary = summarize(samples, elapsed)
+        print_summary(summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
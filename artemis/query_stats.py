@@ -0,0 +1,165 @@
+"""
+Measures of the queries made to navitia by the tests
+
+For each query, the latency of the call, the size and the parse time of the response,
+and the time spent to filter it and to compare it with its reference are recorded.
+The measures are written next to the response of the query, and gathered for the whole session
+to report the latency percentiles by data set and scenario.
+"""
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from artemis.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# steps of a query, in the order they are done
+STEPS = ('latency', 'parse', 'filter', 'compare')
+
+
+def percentile(values, p):
+    """
+    p-th percentile of the values (with a linear interpolation between the closest ranks)
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2.5
+    >>> percentile([10, 1, 5], 100)
+    10
+    >>> percentile([], 95) is None
+    True
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100.
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    if low == high:
+        return values[low]
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+class QueryRecord(object):
+    """
+    measures of a query, the durations are in seconds
+    """
+    def __init__(self, url):
+        self.url = url
+        self.durations = OrderedDict()
+        self.size = None
+        self.status_code = None
+        # data set, scenario and file name of the query
+        self.details = OrderedDict()
+
+    @contextmanager
+    def timed(self, step):
+        begin = time.time()
+        try:
+            yield
+        finally:
+            self.durations[step] = time.time() - begin
+            tracer.complete(step, begin, self.durations[step], category='query', url=self.url)
+
+    @property
+    def latency(self):
+        return self.durations.get('latency')
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def to_dict(self):
+        res = OrderedDict(self.details)
+        res['url'] = self.url
+        res['status_code'] = self.status_code
+        res['size'] = self.size
+        res.update((step, self.durations.get(step)) for step in STEPS)
+        return res
+
+
+class QueryStats(object):
+    """
+    the queries recorded during the session
+
+    >>> stats = QueryStats()
+    >>> for i, latency in enumerate([0.1, 0.2, 0.3, 0.4]):
+    ...     r = QueryRecord('journeys?{}'.format(i))
+    ...     r.durations['latency'] = latency
+    ...     r.details.update(data_set='idfm', scenario='distributed')
+    ...     stats.add(r)
+    >>> [(s['data_set'], s['count'], round(s['p50'], 3)) for s in stats.summary()]
+    [('idfm', 4, 0.25)]
+    >>> [r.url for r in stats.slowest(2)]
+    ['journeys?3', 'journeys?2']
+    """
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def summary(self, group_by=('data_set', 'scenario')):
+        """
+        latency percentiles (in seconds) by group
+        """
+        groups = OrderedDict()
+        for r in self.records():
+            if r.latency is not None:
+                groups.setdefault(tuple(r.details.get(k) for k in group_by), []).append(r.latency)
+
+        res = []
+        for key, latencies in groups.items():
+            s = OrderedDict(zip(group_by, key))
+            s['count'] = len(latencies)
+            for p in (50, 95, 99):
+                s['p{}'.format(p)] = percentile(latencies, p)
+            s['max'] = max(latencies)
+            res.append(s)
+        return res
+
+    def slowest(self, count=10):
+        return sorted((r for r in self.records() if r.latency is not None),
+                      key=lambda r: r.latency, reverse=True)[:count]
+
+    def write_report(self, path, slowest_count=10):
+        report = OrderedDict()
+        report['summary'] = self.summary()
+        report['slowest'] = [r.to_dict() for r in self.slowest(slowest_count)]
+        with open(path, 'w') as f:
+            f.write(json.dumps(report, indent=2))
+        logger.info("query latencies report written in {}".format(path))
+
+    def clear(self):
+        with self._lock:
+            del self._records[:]
+
+
+def write_record(path, record):
+    """
+    write the measures of the query next to its response file
+    """
+    with open(path, 'w') as f:
+        f.write(json.dumps(record.to_dict(), indent=2))
+
+
+def stats_file_path(response_path):
+    """
+    >>> stats_file_path('output/TestIdfm/test_journey.json')
+    'output/TestIdfm/test_journey.stats.json'
+    """
+    if response_path.endswith('.json'):
+        response_path = response_path[:-len('.json')]
+    return response_path + '.stats.json'
+
+
+query_stats = QueryStats()
@@ -0,0 +1,166 @@
+"""
+Benchmark of the data reloads of the coverages
+
+With --benchmark_reload N, the data of each data set is reloaded N times instead of running the tests.
+With Artemis NG, the upload of the data to the tyr_worker container, the binarization and the kraken load
+(until the last_load_at of the coverage changes) are timed.
+With the old artemis, the tyr load_data and the kraken start (until its status is running) are timed.
+
+The results of each session are appended to a history file, and compared with the previous comparable
+session in the history (same harness, host and number of reloads), to follow how the reload times scale with the data and to catch
+the regressions of ed2nav or of the kraken load.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from artemis.configuration_manager import config
+from artemis.query_stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# the sessions of the history compared with each other have the same values for those keys
+_COMPARABLE_KEYS = ('harness', 'host', 'cpu_count', 'repeat')
+
+
+def directory_size(path):
+    """
+    size in bytes of the files in the directory (and its sub directories)
+    """
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+
+def summarize(reloads):
+    """
+    median, min and max of each phase of the reloads (in seconds)
+
+    >>> s = summarize([{'binarization': 10., 'total': 12.}, {'binarization': 20., 'total': 24.},
+    ...                {'binarization': 12., 'total': 13.}])
+    >>> s['binarization']['median'], s['total']['max']
+    (12.0, 24.0)
+    """
+    phases = OrderedDict()
+    for reload in reloads:
+        for phase, duration in reload.items():
+            phases.setdefault(phase, []).append(duration)
+    return OrderedDict((phase, OrderedDict([('median', percentile(durations, 50)),
+                                            ('min', min(durations)),
+                                            ('max', max(durations))]))
+                       for phase, durations in phases.items())
+
+
+def read_history(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current, previous, threshold):
+    """
+    ratio of the median durations of each phase of the coverages with the ones of a previous session
+
+    >>> current = {'idfm': {'summary': {'total': {'median': 30.}}}, 'tcl': {'summary': {'total': {'median': 10.}}}}
+    >>> previous = {'idfm': {'summary': {'total': {'median': 20.}}}}
+    >>> [(c['data_set'], c['phase'], c['ratio'], c['regression']) for c in compare(current, previous, 0.2)]
+    [('idfm', 'total', 1.5, True)]
+    """
+    res = []
+    for data_set, result in sorted(current.items()):
+        previous_summary = previous.get(data_set, {}).get('summary', {})
+        for phase, summary in result['summary'].items():
+            previous_median = previous_summary.get(phase, {}).get('median')
+            if not previous_median:
+                continue
+            ratio = summary['median'] / previous_median
+            res.append(OrderedDict([('data_set', data_set),
+                                    ('phase', phase),
+                                    ('median', summary['median']),
+                                    ('previous_median', previous_median),
+                                    ('ratio', ratio),
+                                    ('regression', ratio > 1 + threshold)]))
+    return res
+
+
+class ReloadBenchmark(object):
+    """
+    reloads measured during the session, by data set
+
+    configured once for the session with the pytest options
+    """
+    def __init__(self):
+        self.repeat = 0
+        self.history_path = None
+        self._reloads = OrderedDict()
+        self._data_sizes = {}
+        self._comparison = []
+        self._lock = threading.Lock()
+
+    def configure(self, repeat=0, history_path=None):
+        self.repeat = repeat or 0
+        self.history_path = history_path
+
+    @property
+    def active(self):
+        return self.repeat > 0
+
+    def done(self, data_set):
+        with self._lock:
+            return data_set in self._reloads
+
+    def add(self, data_set, durations, total, data_size=None):
+        """
+        record the durations (in seconds) of the phases of a reload of the data set, and of the whole reload
+
+        the phases can overlap (a phase and its split in smaller phases)
+        """
+        reload = OrderedDict(durations)
+        reload['total'] = total
+        logger.info("data reload of {}: {}".format(
+            data_set, ', '.join('{} {:.3f}s'.format(phase, d) for phase, d in reload.items())))
+        with self._lock:
+            self._reloads.setdefault(data_set, []).append(reload)
+            if data_size is not None:
+                self._data_sizes[data_set] = data_size
+
+    def results(self):
+        with self._lock:
+            reloads = list(self._reloads.items())
+        return OrderedDict((data_set, OrderedDict([('data_size', self._data_sizes.get(data_set)),
+                                                   ('reloads', data_set_reloads),
+                                                   ('summary', summarize(data_set_reloads))]))
+                           for data_set, data_set_reloads in reloads)
+
+    def write_history(self, environment):
+        """
+        append the results of the session to the history file, and compare them with the previous comparable session
+        """
+        history = read_history(self.history_path)
+        run = OrderedDict(environment)
+        run['harness'] = 'ng' if config.get('USE_ARTEMIS_NG') else 'tyr'
+        run['repeat'] = self.repeat
+        run['coverages'] = self.results()
+
+        previous = [r for r in history if all(r.get(k) == run.get(k) for k in _COMPARABLE_KEYS)]
+        if previous:
+            self._comparison = compare(run['coverages'], previous[-1]['coverages'],
+                                       config['RELOAD_REGRESSION_THRESHOLD'])
+        else:
+            logger.info("no previous data reloads benchmark with the same {} in {}".format(
+                ', '.join(_COMPARABLE_KEYS), self.history_path))
+
+        history.append(run)
+        with open(self.history_path, 'w') as f:
+            f.write(json.dumps(history, indent=2))
+        logger.info("data reloads history written in {}".format(self.history_path))
+
+    def comparison(self):
+        return list(self._comparison)
+
+
+reload_benchmark = ReloadBenchmark()
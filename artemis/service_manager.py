@@ -0,0 +1,133 @@
+"""
+Book keeping of the navitia services shared by the test fixtures
+
+The fixtures generated by set_scenario (and more generally all fixtures on the same data sets)
+need the same krakens. Instead of restarting them for each fixture, the krakens are kept running
+until no upcoming fixture needs them anymore.
+
+A kraken is restarted only when its state needs to be reset, and the reason is kept to be logged
+(realtime feeds received, realtime data loaded from a kirin database that has been cleaned since)
+"""
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceManager(object):
+    """
+    Keep track of the running krakens for the whole test session
+
+    >>> from artemis.test_mechanism import DataSet
+    >>> services = ServiceManager()
+    >>> tcl, idfm = DataSet('tcl'), DataSet('idfm')
+    >>> services.plan([[tcl], [tcl], [idfm]])
+    >>> services.started([tcl])
+    >>> services.ready([tcl])
+    True
+    >>> [d.name for d in services.release([tcl])]  # still needed by the second fixture
+    []
+    >>> services.mark_dirty('tcl', 'realtime feeds received')
+    >>> services.ready([tcl])
+    False
+    >>> services.restart_reasons([tcl, idfm])
+    [('tcl', 'realtime feeds received')]
+    >>> [d.name for d in services.release([tcl])]
+    ['tcl']
+    """
+    def __init__(self):
+        # number of upcoming fixtures needing each data set
+        # None means that nothing has been planned, so nothing is kept running between fixtures
+        self._pending = None
+        self._running = set()
+        # the state of those krakens has been modified by the tests (realtime feeds for example), with the reason
+        self._dirty = {}
+        # some realtime feeds might have been sent to kirin since its database has been cleaned
+        # (unknown at the beginning of the session)
+        self.realtime_dirty = True
+        # the krakens started after the last cleaning of the kirin database, and not modified since
+        self._realtime_clean = set()
+        # (name, scenario) of the instances registered in the jormungandr database
+        self.jormungandr_instances = None
+        # the scenarios have been changed in the jormungandr database since jormungandr started
+        # (so it might not be aware of it)
+        self.scenario_overridden = False
+
+    def plan(self, fixtures_data_sets):
+        """
+        register the data sets of all the fixtures that will be run
+
+        :param fixtures_data_sets: list of the data sets of each fixture
+        """
+        self._pending = Counter(name
+                                for data_sets in fixtures_data_sets
+                                for name in set(d.name for d in data_sets))
+        logger.debug("planned data sets usage: {}".format(dict(self._pending)))
+
+    def started(self, data_sets):
+        names = set(d.name for d in data_sets)
+        self._running |= names
+        # a kraken loads the realtime data from kirin at startup
+        if self.realtime_dirty:
+            self._realtime_clean -= names
+        else:
+            self._realtime_clean |= names
+
+    def stopped(self, data_sets):
+        names = set(d.name for d in data_sets)
+        self._running -= names
+        self._realtime_clean -= names
+        for name in names:
+            self._dirty.pop(name, None)
+
+    def mark_dirty(self, data_set_name, reason='state modified by the tests'):
+        self._dirty[data_set_name] = reason
+        self._realtime_clean.discard(data_set_name)
+
+    def is_dirty(self, data_set_name):
+        return data_set_name in self._dirty
+
+    def is_running(self, data_set_name):
+        return data_set_name in self._running
+
+    def ready(self, data_sets):
+        """
+        check that all the krakens are running and have not been modified
+        """
+        return all(self.is_running(d.name) and not self.is_dirty(d.name) for d in data_sets)
+
+    def dirty(self, data_sets):
+        """
+        return the running krakens that need to be restarted to be used again
+        """
+        return [d for d in data_sets if self.is_running(d.name) and self.is_dirty(d.name)]
+
+    def restart_reasons(self, data_sets):
+        """
+        return (name, reason) for the running krakens that need to be restarted to be used again
+        """
+        return [(d.name, self._dirty[d.name]) for d in self.dirty(data_sets)]
+
+    def realtime_unclean(self, data_sets):
+        """
+        return the krakens that might have realtime data not in the kirin database
+        (or that have not been started by the harness)
+        """
+        return [d for d in data_sets if d.name not in self._realtime_clean]
+
+    def release(self, data_sets):
+        """
+        a fixture does not need its data sets anymore
+
+        return the data sets that are not needed by any upcoming fixture
+        """
+        if self._pending is None:
+            return list(data_sets)
+
+        for name in set(d.name for d in data_sets):
+            self._pending[name] -= 1
+
+        return [d for d in data_sets if self._pending[d.name] <= 0]
+
+
+services = ServiceManager()
@@ -1,14 +1,21 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import logging
 import os
 import shutil
-import psycopg2
 import json
+import time
 import pytest
-from retrying import Retrying, retry, RetryError
 from artemis import default_checker
 from artemis import utils
+from artemis import waiting
+from artemis import load_test
 from artemis.configuration_manager import config
+from artemis.service_manager import services
+from artemis.db import Database, execute_prepared, insert_many
+from artemis.latency_baseline import latency_checker
+from artemis.reload_benchmark import directory_size, reload_benchmark
+from artemis.timing import timings
+from artemis.tracing import tracer
 import datetime
 from artemis.common_fixture import CommonTestFixture, truncate_tables
 
@@ -18,6 +25,8 @@ _tyr_config_file = config['TYR_DIR'] + "/settings.py"
 # to limit the permissions of the jenkins user on the artemis platform, we create a proxy for all kraken services
 _kraken_wrapper = '/usr/local/bin/kraken_service_wrapper'
 
+_jormungandr_db = Database(config['JORMUNGANDR_DB'])
+
 
 def dir_path(dataset):
     p = config['DATASET_PATH_LAYOUT']
@@ -34,10 +43,14 @@ class DataSet(object):
                  name,
                  reload_timeout=datetime.timedelta(minutes=2),
                  fixed_wait=datetime.timedelta(seconds=1),
-                 scenario='default'):
+                 scenario='default',
+                 max_latency_ms=None):
         self.name = name
         self.scenario = scenario
+        # default latency budget of the queries on this data set
+        self.max_latency_ms = max_latency_ms
         self.reload_timeout = reload_timeout
+        # max interval between two polls of the kraken status
         self.fixed_wait = fixed_wait
 
     def __str__(self):
@@ -53,7 +66,8 @@ def set_scenario(config):
                     cls.data_sets.append(DataSet(name=dataset.name,
                                                  reload_timeout=datetime.timedelta(minutes=2),
                                                  fixed_wait=datetime.timedelta(seconds=1),
-                                                 scenario=dataset.scenario))
+                                                 scenario=dataset.scenario,
+                                                 max_latency_ms=dataset.max_latency_ms))
         if config:
             for dataset in cls.data_sets:
                 conf = config.get(dataset.name, None)
@@ -74,14 +88,32 @@ def kraken_status(data_set):
     return current_region['status']
 
 
+def wait_for_kraken(data_set):
+    """
+    wait for the kraken of the data set to be running
+
+    the status is polled with an exponential backoff: the first polls are close to each other
+    so a fast kraken is detected quickly, the interval then grows up to data_set.fixed_wait
+    """
+    waiting.wait_for(lambda: kraken_status(data_set),
+                     until=lambda status: status == 'running',
+                     name='kraken start', label=data_set.name,
+                     timeout=data_set.reload_timeout.total_seconds(),
+                     max_wait=data_set.fixed_wait.total_seconds())
+
+
 class ArtemisTestFixture(CommonTestFixture):
     """
     Mother class for all integration tests
     """
     dataset_binarized = []
 
+    # when set (with --multi_scenario), each query is done for all those scenarios
+    # and checked against each scenario's reference
+    multi_scenarios = None
+
     @pytest.fixture(scope='function', autouse=True)
-    def before_each_test(self):
+    def before_each_test(self, request):
         """
         setup function called before each test
 
@@ -89,6 +121,9 @@ class ArtemisTestFixture(CommonTestFixture):
         so we init the class in the setup
         """
         self.test_counter = defaultdict(int)
+        self.init_latency_budget(request)
+        if reload_benchmark.active:
+            pytest.skip("only the data reloads are benchmarked")
 
     @classmethod
     @pytest.yield_fixture(scope='class', autouse=True)
@@ -111,6 +146,7 @@ class ArtemisTestFixture(CommonTestFixture):
             cls.clean_fixture()
 
     @classmethod
+    @tracer.traced()
     def init_fixture(cls, skip_bina, journey_full_response_comparison_mode, check_ref):
         """
         Method called once before running the tests of the fixture
@@ -131,17 +167,34 @@ class ArtemisTestFixture(CommonTestFixture):
         if check_ref:
             return
 
+        if services.ready(cls.data_sets):
+            if cls.only_scenario_differs(services.jormungandr_instances):
+                cls.switch_scenario()
+
+            if services.jormungandr_instances == cls.jormungandr_instances():
+                # a previous fixture left everything we need running
+                logging.getLogger(__name__).info("reusing the running services for {}".format(cls.__name__))
+                cls.run_additional_service()
+                return
+
         cls.kill_jormungandr()
 
         cls.run_additional_service()
 
         cls.manage_data(skip_bina)
 
+        # the krakens modified by the previous fixtures are restarted
+        cls.kill_the_krakens(services.dirty(cls.data_sets), reason='state modified by a previous fixture')
+
         cls.pop_krakens()
 
         cls.pop_jormungandr()
 
+        if reload_benchmark.active:
+            cls.benchmark_data_reload()
+
     @classmethod
+    @tracer.traced()
     def manage_data(cls, skip_bina):
 
         cls.clean_jormun_db()
@@ -160,6 +213,32 @@ class ArtemisTestFixture(CommonTestFixture):
             cls.dataset_binarized.append(data_set.name)
 
     @classmethod
+    @tracer.traced()
+    def benchmark_data_reload(cls):
+        """
+        load the data of each data set (not benchmarked yet) with tyr and restart its kraken, several times
+        """
+        for data_set in cls.data_sets:
+            if reload_benchmark.done(data_set.name):
+                continue
+            data_size = directory_size(utils.instance_data_path(data_set.name))
+            for _ in range(reload_benchmark.repeat):
+                durations = OrderedDict()
+                begin = time.time()
+                cls.remove_data_by_dataset(data_set)
+                cls.read_data_by_dataset(data_set)
+                durations['tyr load_data'] = time.time() - begin
+
+                begin = time.time()
+                cls.kill_the_krakens([data_set], reason='data reload benchmark')
+                cls.pop_krakens()
+                wait_for_kraken(data_set)
+                durations['kraken load'] = time.time() - begin
+
+                reload_benchmark.add(data_set.name, durations, total=sum(durations.values()), data_size=data_size)
+
+    @classmethod
+    @tracer.traced()
     def remove_data_by_dataset(cls, data_set):
         logging.getLogger(__name__).debug("deleting data for {}".format(data_set.name))
         try:
@@ -169,6 +248,7 @@ class ArtemisTestFixture(CommonTestFixture):
             logging.getLogger(__name__).exception("can't remove data.nav.lz4")
 
     @classmethod
+    @tracer.traced()
     def update_data_by_dataset(cls, data_set):
         fusio_databases_file = utils.new_fusio_files_path(data_set.name)
         if not os.path.exists(fusio_databases_file):
@@ -180,6 +260,7 @@ class ArtemisTestFixture(CommonTestFixture):
         shutil.move(fusio_databases_file, os.path.join(utils.instance_data_path(data_set.name), 'fusio/databases.zip'))
 
     @classmethod
+    @tracer.traced()
     def read_data_by_dataset(cls, data_set):
         logging.getLogger(__name__).debug("reading data for {}".format(data_set.name))
         # we'll read all subdir
@@ -197,15 +278,18 @@ class ArtemisTestFixture(CommonTestFixture):
                           additional_env={'TYR_CONFIG_FILE': _tyr_config_file})
 
     @classmethod
+    @tracer.traced()
     def clean_fixture(cls):
         """
         Method called once after running the tests of the fixture.
         """
         logging.getLogger(__name__).debug("Tearing down the tests {}, time to clean up"
                                           .format(cls.__name__))
-        cls.kill_the_krakens()
+        # the krakens still needed by the upcoming fixtures are kept running
+        cls.kill_the_krakens(services.release(cls.data_sets), reason='not needed by the upcoming fixtures')
 
     @classmethod
+    @tracer.traced()
     def run_additional_service(cls):
         """
         run all services that have to be active for all tests
@@ -213,53 +297,108 @@ class ArtemisTestFixture(CommonTestFixture):
         pass
 
     @classmethod
+    @tracer.traced()
     def clean_jormun_db(cls):
         logging.getLogger(__name__).debug("cleaning jormungandr database")
-        conn = psycopg2.connect(config['JORMUNGANDR_DB'])
         try:
-            cur = conn.cursor()
-            tables = ['data_set', 'instance', 'job']
+            with timings.timed('jormungandr db cleaning'), _jormungandr_db.cursor() as cur:
+                tables = ['data_set', 'instance', 'job']
 
-            truncate_tables(cur, ', '.join(tables))
+                truncate_tables(cur, ', '.join(tables))
 
-            #we add the instances in the table
-            for data_set in cls.data_sets:
-                cur.execute("INSERT INTO instance (name, is_free, is_open_data, scenario) VALUES ('{}', true, false, '{}');".format(data_set.name, data_set.scenario))
+                #we add the instances in the table
+                insert_many(cur, 'instance', ('name', 'is_free', 'is_open_data', 'scenario'),
+                            [(data_set.name, True, False, data_set.scenario) for data_set in cls.data_sets])
 
-            conn.commit()
+            services.jormungandr_instances = cls.jormungandr_instances()
             logging.getLogger(__name__).debug("query done")
         except:
             logging.getLogger(__name__).exception("problem with jormun db")
-            conn.close()
             assert False, "problem while cleaning jormungandr db"
-        conn.close()
 
     @classmethod
+    def jormungandr_instances(cls):
+        return tuple((data_set.name, data_set.scenario) for data_set in cls.data_sets)
+
+    @classmethod
+    def only_scenario_differs(cls, instances):
+        """
+        check if the given jormungandr instances are the fixture's ones with another scenario
+
+        Note: the scenario can only be overridden in the queries on one region
+        """
+        if len(cls.data_sets) != 1 or not instances:
+            return False
+        return [name for name, _ in instances] == [d.name for d in cls.data_sets] \
+            and instances != cls.jormungandr_instances()
+
+    @classmethod
+    @tracer.traced()
+    def switch_scenario(cls):
+        """
+        change the scenario of the instances without restarting any service
+
+        The scenario is updated in the jormungandr database, but since jormungandr caches it,
+        the scenario is also given in each journey query until jormungandr is restarted
+        """
+        logging.getLogger(__name__).info("switching scenario for {} without restarting the services"
+                                         .format(cls.__name__))
+        try:
+            with timings.timed('jormungandr scenario switch'), _jormungandr_db.cursor() as cur:
+                for data_set in cls.data_sets:
+                    execute_prepared(cur, 'artemis_switch_scenario',
+                                     "UPDATE instance SET scenario = $1 WHERE name = $2",
+                                     (data_set.scenario, data_set.name))
+        except:
+            logging.getLogger(__name__).exception("problem with jormun db")
+            assert False, "problem while switching scenario in jormungandr db"
+
+        services.jormungandr_instances = cls.jormungandr_instances()
+        services.scenario_overridden = True
+
+    @classmethod
+    @tracer.traced()
     def pop_krakens(cls):
         """
-        launch all the kraken services
+        launch all the kraken services that are not already running
         """
         if cls.check_ref:
             return
 
-        for data_set in cls.data_sets:
+        data_sets = [d for d in cls.data_sets if not services.is_running(d.name)]
+
+        def start_kraken(data_set):
             logging.getLogger(__name__).debug("launching the kraken {}".format(data_set.name))
             return_code, _ = utils.launch_exec('sudo {service} {kraken} start'.format(service=_kraken_wrapper, kraken=data_set.name))
 
             assert return_code == 0, "command failed"
 
+        # the krakens are independent, we start them all at once
+        utils.run_concurrently(start_kraken, data_sets)
+        services.started(data_sets)
+
     @classmethod
-    def kill_the_krakens(cls):
+    @tracer.traced()
+    def kill_the_krakens(cls, data_sets=None, reason='asked by the test'):
+        """
+        stop the kraken services (all the fixture's ones by default)
+        """
         if cls.check_ref:
             return
 
-        for data_set in cls.data_sets:
-            logging.getLogger(__name__).debug("killing the kraken {}".format(data_set.name))
+        data_sets = cls.data_sets if data_sets is None else data_sets
+
+        def stop_kraken(data_set):
+            logging.getLogger(__name__).info("killing the kraken {}: {}".format(data_set.name, reason))
             return_code, _ = utils.launch_exec('sudo {service} {kraken} stop'.format(service=_kraken_wrapper, kraken=data_set.name))
 
             assert return_code == 0, "command failed"
 
+        utils.run_concurrently(stop_kraken, data_sets)
+        services.stopped(data_sets)
+
     @classmethod
+    @tracer.traced()
     def pop_jormungandr(cls):
         """
         launch the front end
@@ -271,20 +410,20 @@ class ArtemisTestFixture(CommonTestFixture):
         utils.launch_exec('sudo service apache2 status')
 
         assert ret == 0, "cannot start apache"
+        # jormungandr has just read the scenarios in its database
+        services.scenario_overridden = False
 
         # to have better errors, we check at the beginning that all is right
-        for data_set in cls.data_sets:
+        cls.wait_for_krakens()
 
-            # we wait a bit for the kraken to be started
-            try:
-                Retrying(stop_max_delay=data_set.reload_timeout.total_seconds() * 1000,
-                         wait_fixed=data_set.fixed_wait.total_seconds() * 1000,
-                         retry_on_result=lambda x: x != 'running') \
-                    .call(kraken_status, data_set)
-            except RetryError as e:
-                assert False, "region {r} KO, status={s}".format(r=data_set.name, s=e.last_attempt.value)
+    @classmethod
+    @tracer.traced()
+    def wait_for_krakens(cls):
+        # all the krakens are polled at the same time, so we only wait for the slowest one
+        utils.run_concurrently(wait_for_kraken, cls.data_sets)
 
     @classmethod
+    @tracer.traced()
     def kill_jormungandr(cls):
         logging.getLogger(__name__).debug("killing jormungandr")
         utils.launch_exec('sudo service apache2 status')
@@ -297,29 +436,7 @@ class ArtemisTestFixture(CommonTestFixture):
     # wrappers around utils functions #
     ###################################
 
-    @retry(stop_max_delay=25000, wait_fixed=500)
-    def get_last_rt_loaded_time(self, cov):
-        if self.check_ref:
-            return
-
-        _res, _, status_code = utils.request("coverage/{cov}/status".format(cov=cov))
-
-        if status_code == 503:
-            raise Exception("Navitia is not available")
-
-        return _res.get('status', {}).get('last_rt_data_loaded', object())
-
-    @retry(stop_max_delay=60000, wait_fixed=500)
-    def wait_for_rt_reload(self, last_rt_data_loaded, cov):
-        if self.check_ref:
-            return
-
-        rt_data_loaded = self.get_last_rt_loaded_time(cov)
-
-        if last_rt_data_loaded == rt_data_loaded:
-            raise Exception("real time data not loaded")
-
-    def api(self, url, response_checker=default_checker.default_checker):
+    def api(self, url, response_checker=default_checker.default_checker, max_latency_ms=None):
         """
         used to check misc API
 
@@ -328,36 +445,106 @@ class ArtemisTestFixture(CommonTestFixture):
         if len(self.__class__.data_sets) == 1:
             full_url = "coverage/{region}/{url}".format(region=self.__class__.data_sets[0].name, url=url)
 
-        return self._api_call(full_url, response_checker)
+        return self._api_call(full_url, response_checker, max_latency_ms=max_latency_ms)
 
-    def _api_call(self, url, response_checker):
+    @tracer.traced()
+    def _api_call(self, url, response_checker, max_latency_ms=None):
         """
         call the api and check against previous results
 
         the query is writen in a file
         """
+        if load_test.query_corpus.collecting:
+            return self.collect_query(url)
+
+        if self.multi_scenarios:
+            return self._multi_scenario_api_call(url, response_checker, scenario_dependent=False,
+                                                 max_latency_ms=max_latency_ms)
+
         if self.check_ref:  # only check consistency
             filename = self.get_file_name()
             assert utils.check_reference_consistency(filename, response_checker)
             return
 
-        response, url, _ = utils.request(url)
-        filtered_response = response_checker.filter(response)
+        response, url, _, record = utils.request_with_stats(url)
+        with record.timed('filter'):
+            filtered_response = response_checker.filter(response)
 
         filename = self._save_response(url, response, filtered_response)
 
-        utils.compare_with_ref(filtered_response, filename, response_checker)
+        self.record_latency_budget(record, max_latency_ms)
+        try:
+            with record.timed('compare'):
+                utils.compare_with_ref(filtered_response, filename, response_checker)
+            self.check_latency_budget(record)
+            latency_checker.check(filename, record)
+        finally:
+            self.record_query(filename, record)
+
+    @tracer.traced()
+    def _multi_scenario_api_call(self, url, response_checker, scenario_dependent, max_latency_ms=None):
+        """
+        call the api for all the scenarios at once and check each response against its scenario's reference
+
+        if the query does not depend on the scenario, it is done only once
+        the errors of all the scenarios are reported together
+        """
+        def scenario_url(scenario):
+            if not scenario_dependent:
+                return url
+            return "{url}&_override_scenario={s}".format(url=url, s=scenario)
+
+        if load_test.query_corpus.collecting:
+            for scenario in self.multi_scenarios:
+                self.collect_query(scenario_url(scenario), scenario=scenario)
+            return
+
+        # the file names are computed here since they need the calling test function in the stack
+        filenames = OrderedDict((s, self.get_file_name(scenario=s)) for s in self.multi_scenarios)
+
+        if self.check_ref:  # only check consistency
+            for filename in filenames.values():
+                assert utils.check_reference_consistency(filename, response_checker)
+            return
+
+        urls = sorted(set(scenario_url(s) for s in filenames))
+        responses = dict(zip(urls, utils.run_concurrently(utils.request_with_stats, urls)))
+
+        errors = []
+        for scenario, filename in filenames.items():
+            response, full_url, _, record = responses[scenario_url(scenario)]
+            # the same call can be shared by several scenarios
+            record = record.copy()
+            self.record_latency_budget(record, max_latency_ms)
+            try:
+                with record.timed('filter'):
+                    filtered_response = response_checker.filter(response)
+                self._save_response(full_url, response, filtered_response, filename=filename)
+                with record.timed('compare'):
+                    utils.compare_with_ref(filtered_response, filename, response_checker)
+                self.check_latency_budget(record)
+                latency_checker.check(filename, record)
+            except AssertionError as e:
+                logging.getLogger(__name__).error("scenario {}: {}".format(scenario, e))
+                errors.append(u"[scenario {}] {}".format(scenario, e))
+            finally:
+                self.record_query(filename, record, scenario=scenario)
+
+        assert not errors, u"\n".join(errors)
 
     def journey(self, _from, to, datetime, datetime_represents='departure',
                 response_checker=default_checker.default_journey_checker,
                 auto_from=None, auto_to=None,
                 first_section_mode=[], last_section_mode=[],
+                max_latency_ms=None,
                 **kwargs):
         """
         syntactic sugar around the journey api
 
         auto_from and auto_to are used to access the autocomplete api
 
+        max_latency_ms is the latency budget of the call (by default the one of the test or of the data set)
+
         TODO: example
 
         TODO: just forward args to the 'request' module without creating a string
@@ -380,23 +567,33 @@ class ArtemisTestFixture(CommonTestFixture):
 
         for k, v in kwargs.iteritems():
             query = "{query}&{k}={v}".format(query=query, k=k, v=v)
+
+        if self.journey_full_response_comparison_mode:
+            # we want to compare the journeys very thoroughly, check the non regression on the full_response
+            response_checker = default_checker.journeys_retrocompatibility_checker
+
         if len(self.__class__.data_sets) == 1:
             # for tests with only one dataset, we directly use the region's journey API
             # Note: this should not be mandatory, but since there are still bugs with the global journey API
             # we use this for the moment.
             query = "coverage/{region}/journeys?{q}".format(region=self.__class__.data_sets[0].name, q=query)
 
-        if self.journey_full_response_comparison_mode:
-            # we want to compare the journeys very thoroughly, check the non regression on the full_response
-            response_checker = default_checker.journeys_retrocompatibility_checker
+            if self.multi_scenarios:
+                return self._multi_scenario_api_call(query, response_checker, scenario_dependent=True,
+                                                     max_latency_ms=max_latency_ms)
+
+            if services.scenario_overridden:
+                # the scenario has been switched without restarting jormungandr, we force it
+                query = "{query}&_override_scenario={s}".format(query=query,
+                                                                  s=self.__class__.data_sets[0].scenario)
 
-        self._api_call(query, response_checker)
+        self._api_call(query, response_checker, max_latency_ms=max_latency_ms)
 
-    def _save_response(self, url, response, filtered_response):
+    def _save_response(self, url, response, filtered_response, filename=None):
         """
         save the response in a file and return the filename (with the fixture directory)
         """
-        filename = self.get_file_name()
+        filename = filename or self.get_file_name()
         file_complete_path = os.path.join(config['RESPONSE_FILE_PATH'], filename)
         if not os.path.exists(os.path.dirname(file_complete_path)):
             os.makedirs(os.path.dirname(file_complete_path))
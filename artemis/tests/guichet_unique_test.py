@@ -1,4 +1,3 @@
-from artemis.common_fixture import clean_kirin_db
 from artemis.test_mechanism import dataset, DataSet, set_scenario
 from artemis.tests.fixture import ArtemisTestFixture
 import pytest
@@ -7,9 +6,23 @@ xfail = pytest.mark.xfail
 COVERAGE = "guichet-unique"
 
 
+@pytest.fixture(scope='class', autouse=True)
+def clean_realtime_before_starting_the_krakens(request):
+    """
+    the kirin database is emptied before the fixture starts its krakens (it runs before the fixture's setup),
+    so they are not restarted by the first reset of the realtime
+    """
+    if not request.config.getvalue("check_ref"):
+        request.cls.clean_realtime()
+
+
 @pytest.fixture(scope='function', autouse=True)
-def clean_kirin_db_before_each_test():
-    return clean_kirin_db()
+def reset_realtime_before_each_test(request):
+    """
+    the realtime data are cleaned only if a previous test has sent some
+    """
+    if not request.config.getvalue("check_ref"):
+        request.cls.reset_realtime()
 
 
 @dataset([DataSet(COVERAGE)])
@@ -158,8 +171,8 @@ class GuichetUnique(object):
         Before the removal of the stops, a train (headsign: 5312/5358) travels from 12:39:00 to 13:14:00
         After the removal of the departure stop, an other train (headsign: 5101) travels from 13:11:00 to 13:48:00
         """
-        self.send_and_wait('trip_partially_deleted_5312_tgv.json')
-        self.send_and_wait('trip_partially_deleted_5358_tgv.json')
+        self.send_all_and_wait(['trip_partially_deleted_5312_tgv.json',
+                                'trip_partially_deleted_5358_tgv.json'])
 
         self.journey(_from="stop_area:OCE:SA:87318964",
                      to="stop_area:OCE:SA:87751008",
@@ -0,0 +1,75 @@
+"""
+Collect the time spent in the different steps of the harness
+
+The durations are gathered by category for the whole test session
+and summarized at the end of the session
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from artemis.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class Timings(object):
+    """
+    >>> t = Timings()
+    >>> t.add('kraken reload', 2.0, coverage='tcl')
+    >>> t.add('kraken reload', 4.0, coverage='idfm')
+    >>> [(s['category'], s['count'], s['total'], s['max']) for s in t.summary()]
+    [('kraken reload', 2, 6.0, 4.0)]
+    >>> [r['coverage'] for r in t.records('kraken reload')]
+    ['tcl', 'idfm']
+    """
+    def __init__(self):
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, category, duration, **details):
+        """
+        record a duration that just ended (it is also a span of the trace)
+        """
+        tracer.complete(category, time.time() - duration, duration, category='timing', **details)
+        record = dict(details, duration=duration)
+        with self._lock:
+            self._records.setdefault(category, []).append(record)
+
+    @contextmanager
+    def timed(self, category, **details):
+        """
+        record the time spent in the with block
+        """
+        begin = time.time()
+        try:
+            yield
+        finally:
+            self.add(category, time.time() - begin, **details)
+
+    def records(self, category):
+        with self._lock:
+            return list(self._records.get(category, []))
+
+    def summary(self):
+        with self._lock:
+            categories = list(self._records.items())
+
+        res = []
+        for category, records in categories:
+            durations = [r['duration'] for r in records]
+            res.append({'category': category,
+                        'count': len(durations),
+                        'total': sum(durations),
+                        'mean': sum(durations) / len(durations),
+                        'max': max(durations)})
+        return res
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+timings = Timings()
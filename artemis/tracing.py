@@ -0,0 +1,100 @@
+"""
+Trace of the test session, in the Chrome trace format (readable by chrome://tracing or Perfetto)
+
+Each step of the harness (fixtures lifecycle, waits, navitia calls, ...) is a span,
+the spans of a thread are nested by their times.
+The tracing is disabled by default (enabled with the --trace_file option), the spans are then not recorded.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# the arguments of the traced functions are truncated in the trace
+_MAX_ARG_LENGTH = 200
+
+
+class Tracer(object):
+    """
+    >>> t = Tracer()
+    >>> t.enable()
+    >>> with t.span('manage_data'):
+    ...     with t.span('update_data_by_dataset', data_set='idfm'):
+    ...         pass
+    >>> [(e['name'], e['ph']) for e in t.events() if e['ph'] == 'X']
+    [('update_data_by_dataset', 'X'), ('manage_data', 'X')]
+    """
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._threads = set()
+        self._origin = time.time()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def complete(self, name, begin, duration, category='artemis', **args):
+        """
+        record a span that began at 'begin' (a timestamp) and lasted 'duration' seconds
+        """
+        if not self.enabled:
+            return
+
+        thread = threading.current_thread()
+        event = {'name': name,
+                 'cat': category,
+                 'ph': 'X',
+                 'ts': (begin - self._origin) * 1e6,
+                 'dur': duration * 1e6,
+                 'pid': os.getpid(),
+                 'tid': thread.ident,
+                 'args': args}
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self._events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread.ident,
+                                     'args': {'name': thread.name}})
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name, category='artemis', **args):
+        begin = time.time()
+        try:
+            yield
+        finally:
+            self.complete(name, begin, time.time() - begin, category, **args)
+
+    def traced(self, name=None, category='artemis'):
+        """
+        decorator recording a span for each call of the function (with its arguments, except the first one)
+        """
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                arguments = [str(a)[:_MAX_ARG_LENGTH] for a in args[1:]]
+                with self.span(span_name, category, args=arguments):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f, default=str)
+        logger.info("trace of the session written in {}".format(path))
+
+
+tracer = Tracer()
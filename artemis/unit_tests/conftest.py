@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def load_cities():
+    """
+    the unit tests do not need any navitia service, the cities are not loaded
+    """
+    pass
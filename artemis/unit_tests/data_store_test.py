@@ -0,0 +1,104 @@
+import io
+import tarfile
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from artemis.archive import BytesMember
+from artemis.data_store import ContainerDataStore
+
+ExecResult = namedtuple('ExecResult', ['exit_code', 'output'])
+
+
+class FakeContainer(object):
+    """
+    container with a cache directory, whose uploads take some time
+    """
+    def __init__(self, cached=(), upload_time=0.05):
+        self.cached = set(cached)
+        self.upload_time = upload_time
+        self.uploaded = []
+        self.commands = []
+        self._lock = threading.Lock()
+        self.concurrent_uploads = 0
+        self.max_concurrent_uploads = 0
+
+    def exec_run(self, cmd):
+        self.commands.append(cmd[-1])
+        return ExecResult(0, '\n'.join(sorted(self.cached)).encode('utf-8'))
+
+    def put_archive(self, path, data):
+        with self._lock:
+            self.concurrent_uploads += 1
+            self.max_concurrent_uploads = max(self.max_concurrent_uploads, self.concurrent_uploads)
+        try:
+            names = tarfile.open(fileobj=io.BytesIO(b''.join(data))).getnames()
+            time.sleep(self.upload_time)
+            with self._lock:
+                self.uploaded.extend(names)
+                self.cached.update(names)
+        finally:
+            with self._lock:
+                self.concurrent_uploads -= 1
+
+
+osm = BytesMember(b'osm data', 'osm.pbf')
+gtfs = BytesMember(b'gtfs data', 'gtfs.zip')
+fusio = BytesMember(b'fusio data', 'fusio.zip')
+
+
+def test_put_sends_only_the_files_not_cached():
+    container = FakeContainer(cached=[osm.digest])
+    store = ContainerDataStore(container, '/cache', '/input')
+    store.put([osm, gtfs], '/input/idfm')
+
+    assert container.uploaded == [gtfs.digest]
+    # the files are linked in the input directory
+    assert '/input/idfm/osm.pbf' in container.commands[-1]
+    assert '/input/idfm/gtfs.zip' in container.commands[-1]
+
+    store.put([osm, gtfs], '/input/tcl')
+    assert container.uploaded == [gtfs.digest]
+
+
+def test_concurrent_puts_send_a_shared_file_once():
+    container = FakeContainer()
+    store = ContainerDataStore(container, '/cache', '/input', max_workers=2)
+    puts = [([osm, gtfs], '/input/idfm'), ([osm, fusio], '/input/tcl'), ([osm], '/input/airport')]
+    threads = [threading.Thread(target=store.put, args=put) for put in puts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(container.uploaded) == sorted([osm.digest, gtfs.digest, fusio.digest])
+    assert container.max_concurrent_uploads <= 2
+
+
+def test_forced_put_sends_the_cached_files():
+    container = FakeContainer(cached=[osm.digest])
+    store = ContainerDataStore(container, '/cache', '/input')
+    store.put([osm, gtfs], '/input/idfm', force=True)
+    assert sorted(container.uploaded) == sorted([osm.digest, gtfs.digest])
+
+    store.put([osm], '/input/idfm', force=True)
+    assert sorted(container.uploaded) == sorted([osm.digest, osm.digest, gtfs.digest])
+
+
+def test_failed_upload_is_sent_again():
+    container = FakeContainer()
+    store = ContainerDataStore(container, '/cache', '/input')
+    put_archive = container.put_archive
+
+    def failing_put_archive(path, data):
+        container.put_archive = put_archive
+        raise IOError("connection reset")
+
+    container.put_archive = failing_put_archive
+    with pytest.raises(IOError):
+        store.put([osm], '/input/idfm')
+
+    store.put([osm], '/input/idfm')
+    assert container.uploaded == [osm.digest]
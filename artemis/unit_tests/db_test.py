@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+
+import pytest
+
+from artemis.db import DatabaseCleaner, sort_tables
+
+
+def test_sort_tables_referencing_first():
+    tables = ['vehicle_journey', 'trip_update', 'stop_time_update', 'real_time_update']
+    dependencies = [('trip_update', 'vehicle_journey'),
+                    ('stop_time_update', 'trip_update'),
+                    ('associate_realtimeupdate_tripupdate', 'trip_update')]
+    res = sort_tables(tables, dependencies)
+
+    assert sorted(res) == sorted(tables)
+    assert res.index('stop_time_update') < res.index('trip_update') < res.index('vehicle_journey')
+
+
+def test_sort_tables_self_reference():
+    assert sort_tables(['a', 'b'], [('a', 'a'), ('a', 'b')]) == ['a', 'b']
+
+
+def test_sort_tables_cycle():
+    with pytest.raises(ValueError) as e:
+        sort_tables(['a', 'b', 'c'], [('a', 'b'), ('b', 'c'), ('c', 'a')])
+    assert 'cycle' in str(e.value)
+
+
+class FakeCursor(object):
+    def __init__(self, tables, foreign_keys):
+        self._results = {'pg_stat_user_tables': [(t,) for t in tables],
+                         'pg_constraint': foreign_keys}
+        self._last = None
+        self.queries = []
+        self.connection = self
+        self.prepared_statements = set()
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+        self._last = next((r for k, r in self._results.items() if k in query), None)
+
+    def fetchall(self):
+        return self._last
+
+
+class FakeDatabase(object):
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @contextmanager
+    def cursor(self):
+        yield self._cursor
+
+
+def clean_queries(method, foreign_keys, excluded_tables=('alembic_version',)):
+    cur = FakeCursor(['alembic_version', 'trip_update', 'vehicle_journey'], foreign_keys)
+    DatabaseCleaner(FakeDatabase(cur), excluded_tables=excluded_tables, method=method).clean()
+    return [q for q in cur.queries if 'pg_' not in q]
+
+
+def test_truncate():
+    assert clean_queries('truncate', []) == ['TRUNCATE trip_update, vehicle_journey CASCADE']
+
+
+def test_delete_in_foreign_keys_order():
+    queries = clean_queries('delete', [('trip_update', 'vehicle_journey')])
+    assert queries == ['PREPARE artemis_clean_trip_update AS DELETE FROM trip_update',
+                       'EXECUTE artemis_clean_trip_update',
+                       'PREPARE artemis_clean_vehicle_journey AS DELETE FROM vehicle_journey',
+                       'EXECUTE artemis_clean_vehicle_journey']
+
+
+def test_delete_with_a_cycle_truncates():
+    queries = clean_queries('delete', [('trip_update', 'vehicle_journey'), ('vehicle_journey', 'trip_update')])
+    assert queries == ['TRUNCATE trip_update, vehicle_journey CASCADE']
+
+
+def test_queries_computed_once():
+    cur = FakeCursor(['trip_update'], [])
+    cleaner = DatabaseCleaner(FakeDatabase(cur), method='delete')
+    cleaner.clean()
+    cleaner.clean()
+
+    assert sum('pg_stat_user_tables' in q for q in cur.queries) == 1
+    # the statement is prepared only once on the connection
+    assert cur.queries.count('PREPARE artemis_clean_trip_update AS DELETE FROM trip_update') == 1
+    assert cur.queries.count('EXECUTE artemis_clean_trip_update') == 2
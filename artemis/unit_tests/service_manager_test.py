@@ -0,0 +1,65 @@
+from artemis.service_manager import ServiceManager
+from artemis.test_mechanism import DataSet
+
+tcl, idfm = DataSet('tcl'), DataSet('idfm')
+
+
+def test_dirty_kraken_restart():
+    services = ServiceManager()
+    services.started([tcl, idfm])
+    services.mark_dirty('tcl', 'realtime feeds received')
+
+    assert not services.ready([tcl, idfm])
+    assert [d.name for d in services.dirty([tcl, idfm])] == ['tcl']
+    assert services.restart_reasons([tcl, idfm]) == [('tcl', 'realtime feeds received')]
+
+    services.stopped([tcl])
+    services.started([tcl])
+    assert services.ready([tcl, idfm])
+    assert services.restart_reasons([tcl, idfm]) == []
+
+
+def test_stopped_kraken_is_not_dirty():
+    services = ServiceManager()
+    services.started([tcl])
+    services.mark_dirty('tcl')
+    services.stopped([tcl])
+
+    assert not services.is_running('tcl')
+    assert services.dirty([tcl]) == []
+
+
+def test_realtime_unclean():
+    services = ServiceManager()
+    # the kirin database might have some realtime data at the beginning of the session
+    services.started([tcl])
+    assert services.realtime_unclean([tcl, idfm]) == [tcl, idfm]
+
+    services.realtime_dirty = False
+    services.stopped([tcl])
+    services.started([tcl])
+    assert services.realtime_unclean([tcl, idfm]) == [idfm]
+
+    # a kraken receiving some feeds might have realtime data that will be cleaned from kirin
+    services.mark_dirty('tcl', 'realtime feeds received')
+    assert services.realtime_unclean([tcl, idfm]) == [tcl, idfm]
+
+
+def test_restarted_while_realtime_dirty():
+    services = ServiceManager()
+    services.realtime_dirty = True
+    services.started([tcl])
+    assert services.realtime_unclean([tcl]) == [tcl]
+
+
+def test_release():
+    services = ServiceManager()
+    services.plan([[tcl], [tcl, idfm], [idfm]])
+
+    assert services.release([tcl]) == []
+    assert services.release([tcl, idfm]) == [tcl]
+    assert services.release([idfm]) == [idfm]
+
+
+def test_release_without_plan():
+    assert ServiceManager().release([tcl, idfm]) == [tcl, idfm]
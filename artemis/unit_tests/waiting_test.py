@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from artemis import waiting
+
+
+def test_wait_for_timeout_gives_the_last_value():
+    with pytest.raises(waiting.WaitTimeout) as e:
+        waiting.wait_for(lambda: 'loading', until=lambda v: v == 'running', name='kraken start', label='idfm',
+                         timeout=0.05, first_wait=0.01)
+    assert "kraken start idfm not reached after 0.05s" in str(e.value)
+    assert "last value: 'loading'" in str(e.value)
+
+
+def test_wait_for_timeout_gives_the_last_error():
+    def probe():
+        raise Exception("connection refused")
+
+    with pytest.raises(waiting.WaitTimeout) as e:
+        waiting.wait_for(probe, timeout=0.05, first_wait=0.01)
+    assert "last error: connection refused" in str(e.value)
+
+
+def test_wait_for_is_an_assertion_error():
+    # the tests failing on a timeout are reported as the other failed checks
+    with pytest.raises(AssertionError):
+        waiting.wait_for(lambda: False, until=bool, timeout=0.01, first_wait=0.001)
+
+
+def test_wait_for_does_not_wait_after_the_deadline():
+    begin = time.time()
+    with pytest.raises(waiting.WaitTimeout):
+        waiting.wait_for(lambda: False, until=bool, timeout=0.1, first_wait=10, max_wait=10)
+    assert time.time() - begin < 1
+
+
+def test_wait_for_retries_after_errors():
+    values = iter([Exception("not yet"), None, 'running'])
+
+    def probe():
+        value = next(values)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    assert waiting.wait_for(probe, until=lambda v: v == 'running', first_wait=0.001) == 'running'
+
+
+def test_wait_for_is_woken_up():
+    wake = threading.Event()
+    values = iter([None, 'running'])
+    threading.Timer(0.05, wake.set).start()
+
+    begin = time.time()
+    assert waiting.wait_for(lambda: next(values), until=lambda v: v == 'running',
+                            first_wait=30, max_wait=30, timeout=60, wake=wake) == 'running'
+    assert time.time() - begin < 5
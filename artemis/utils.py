@@ -10,14 +10,22 @@ import logging
 from flask import json
 import werkzeug
 from artemis.configuration_manager import config
+from artemis.query_stats import QueryRecord
 import subprocess
 import select
+import sys
+import threading
+import six
 import flask_restful
 from copy import deepcopy
 import re
 import jsonpath_rw as jp
 import functools
 import inspect
+from multiprocessing.pool import ThreadPool
+
+_pool = None
+_pool_lock = threading.Lock()
 
 
 ARTEMIS_CUSTOM_ID = '__artemis_id__'
@@ -47,10 +55,27 @@ def request(url):
 
     return the response and the url called (it might have been modified with the normalization)
     """
+    response, norm_url, status_code, _ = request_with_stats(url)
+    return response, norm_url, status_code
+
+
+def request_with_stats(url):
+    """
+    call the api like 'request'
+
+    return also a QueryRecord with the latency of the call, the size of the response and its parse time
+    """
     norm_url = werkzeug.url_fix(_api_current_root_point + url)  # normalize url
-    raw_response = requests.get(norm_url)
+    record = QueryRecord(norm_url)
+    with record.timed('latency'):
+        raw_response = requests.get(norm_url)
+    record.size = len(raw_response.content)
+    record.status_code = raw_response.status_code
 
-    return json.loads(raw_response.text), norm_url, raw_response.status_code
+    with record.timed('parse'):
+        response = json.loads(raw_response.text)
+
+    return response, norm_url, raw_response.status_code, record
 
 
 def get_ref(call_id):
@@ -131,6 +156,72 @@ def check_reference_consistency(call_id, checker):
     return is_ok
 
 
+def _get_pool():
+    """
+    pool of threads shared by all the concurrent calls of the session
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(config['THREAD_POOL_SIZE'])
+        return _pool
+
+
+def run_concurrently(func, iterable, max_workers=None):
+    """
+    call func on each element of iterable, in the threads of the pool shared by the session
+
+    at most max_workers elements are handled at the same time.
+    The calling thread handles elements too: a call nested in another one (func calling run_concurrently)
+    cannot be stuck waiting for a thread of the pool held by its caller.
+
+    return the results in the same order as the elements
+    the first exception raised by a call is raised again in the caller
+
+    >>> run_concurrently(lambda x: x * 2, [1, 2, 3])
+    [2, 4, 6]
+    >>> run_concurrently(lambda x: sum(run_concurrently(lambda y: x * y, [1, 2])), [1, 2, 3], max_workers=2)
+    [3, 6, 9]
+    """
+    elts = list(iterable)
+    if len(elts) <= 1:
+        # no need to use the pool
+        return [func(e) for e in elts]
+
+    todo = deque(enumerate(elts))
+    results = [None] * len(elts)
+    errors = []
+    remaining = [len(elts)]
+    finished = threading.Condition()
+
+    def work():
+        while True:
+            try:
+                i, elt = todo.popleft()
+            except IndexError:
+                return
+            try:
+                results[i] = func(elt)
+            except:
+                errors.append(sys.exc_info())
+            finally:
+                with finished:
+                    remaining[0] -= 1
+                    finished.notify_all()
+
+    pool = _get_pool()
+    for _ in range(min(len(elts), max_workers or len(elts)) - 1):
+        pool.apply_async(work)
+    work()
+
+    with finished:
+        while remaining[0]:
+            finished.wait()
+    if errors:
+        six.reraise(*errors[0])
+    return results
+
+
 def launch_exec_background(exec_name, args):
     logging.getLogger(__name__).debug('Launching ' + exec_name + ' ' + ' '.join(args))
     args.insert(0, exec_name)
@@ -0,0 +1,96 @@
+"""
+Wait for a condition on the navitia services
+
+All the polls of the harness (kraken status, realtime and data reloads) go through wait_for:
+the first probe is done right away, then the interval between two probes grows exponentially
+(with some jitter) up to a maximum, until the deadline of the condition.
+The wait between two probes can be interrupted by an event (a log line of a container for example),
+the condition is then probed right away.
+
+Each wait is recorded in the timings, so the real reload latencies can be checked.
+"""
+import itertools
+import logging
+import random
+import time
+
+from artemis.timing import timings
+
+logger = logging.getLogger(__name__)
+
+
+class WaitTimeout(AssertionError):
+    pass
+
+
+def backoff_delays(first_wait, max_wait, factor=2., jitter=0.):
+    """
+    generate the delays between two probes
+
+    >>> list(itertools.islice(backoff_delays(0.1, 1), 6))
+    [0.1, 0.2, 0.4, 0.8, 1, 1]
+    >>> all(0.9 <= d <= 1.1 for d in itertools.islice(backoff_delays(1, 1, jitter=0.1), 10))
+    True
+    """
+    delay = first_wait
+    while True:
+        delay = min(delay, max_wait)
+        yield delay * random.uniform(1 - jitter, 1 + jitter) if jitter else delay
+        delay *= factor
+
+
+def wait_for(probe, until=lambda value: True, name='condition', label='', timeout=60.,
+             first_wait=0.05, max_wait=1., factor=2., jitter=0.2, wake=None):
+    """
+    call probe until its result satisfies 'until' and return this result
+
+    the exceptions raised by the probe are considered as a failed probe
+    raise a WaitTimeout if the condition is not met after 'timeout' seconds
+    if 'wake' (a threading.Event) is set, the condition is probed without waiting for the end of the delay
+
+    >>> values = iter([None, None, 'running'])
+    >>> wait_for(lambda: next(values), until=lambda v: v == 'running', first_wait=0.001)
+    'running'
+    >>> try:
+    ...     wait_for(lambda: 'loading', until=lambda v: v == 'running', name='kraken', timeout=0.01, first_wait=0.001)
+    ... except WaitTimeout as e:
+    ...     print(e)  # doctest: +ELLIPSIS
+    kraken not reached after 0.01s (... probes), last value: 'loading'
+    >>> import threading
+    >>> wake = threading.Event()
+    >>> values = iter([None, 'running'])
+    >>> wake.set()
+    >>> wait_for(lambda: next(values), until=lambda v: v == 'running', first_wait=60, wake=wake)
+    'running'
+    """
+    what = ' '.join(w for w in (name, label) if w)
+    begin = time.time()
+    deadline = begin + timeout
+    delays = backoff_delays(first_wait, max_wait, factor, jitter)
+    last_value, last_error = None, None
+
+    for attempt in itertools.count(1):
+        try:
+            last_value, last_error = probe(), None
+            if until(last_value):
+                duration = time.time() - begin
+                timings.add(name, duration, label=label, attempts=attempt, success=True)
+                logger.info("waited {:.3f}s for {} ({} probes)".format(duration, what, attempt))
+                return last_value
+        except Exception as e:
+            last_error = e
+            logger.debug("{}: probe failed: {}".format(what, e))
+
+        now = time.time()
+        if now >= deadline:
+            break
+        delay = min(next(delays), deadline - now)
+        if wake is None:
+            time.sleep(delay)
+        elif wake.wait(delay):
+            wake.clear()
+
+    timings.add(name, time.time() - begin, label=label, attempts=attempt, success=False)
+    raise WaitTimeout("{} not reached after {}s ({} probes), last {}".format(
+        what, timeout, attempt,
+        "error: {}".format(last_error) if last_error else "value: {!r}".format(last_value)))